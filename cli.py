@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the experiment pipeline.
+
+  python cli.py list                      # scenarios and run counts
+  python cli.py status                    # which stage outputs are stale
+  python cli.py collect --scenario NAME   # run oneflow_script.sh
+  python cli.py summarize | pcap | udp | plot
+  python cli.py all [--scenario NAME]     # stages whose outputs are out of date
+                                          # (--scenario always collects first)
+
+Only the standard library is imported here; pandas, NumPy and matplotlib
+are loaded inside the subcommands that need them, so list/status stay fast.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROOT = "demo"
+RUN_RE = re.compile(r"run[_-]?\d+")
+
+# ============================================================
+# Tree scanning (stdlib only)
+# ============================================================
+def scenario_dirs(root, is_run=RUN_RE.search):
+    """[(scenario, path, [run paths])] for every scenario folder under root."""
+    out = []
+    if not os.path.isdir(root):
+        return out
+    for scen in sorted(os.scandir(root), key=lambda e: e.name):
+        if not scen.is_dir():
+            continue
+        runs = sorted(e.path for e in os.scandir(scen.path) if e.is_dir() and is_run(e.name))
+        out.append((scen.name, scen.path, runs))
+    return out
+
+def run_files(root, match, is_run=RUN_RE.search):
+    """Files inside run folders whose name satisfies match(name)."""
+    for _, _, runs in scenario_dirs(root, is_run):
+        for run in runs:
+            for e in os.scandir(run):
+                if e.is_file() and match(e.name):
+                    yield e.path
+
+def newest_mtime(paths):
+    return max((os.path.getmtime(p) for p in paths), default=None)
+
+# ============================================================
+# Stages: inputs, outputs and how to run them
+# ============================================================
+# Inputs must be exactly what each stage reads: a file the stage ignores
+# would leave its output "missing" (nothing written) and rerun it every time
+def summarize_inputs(args):
+    # summary.summarize_scenario only treats folders with "_run_" in the name as runs
+    return run_files(args.root, lambda n: n in ("tcp.json", "udp.json")
+                     or (n.startswith("ifstat_") and n.endswith(".log")),
+                     is_run=lambda n: "_run_" in n)
+
+def pcap_captures(name, include_udp=False):
+    """Names pcap_summary.process_all_runs summarizes (not rotated segments)."""
+    n = name.lower()
+    return (n in ("server.pcap", "bottleneck.pcap") or n.endswith(".partial.json")
+            or (n.endswith(".pcap") and (n.startswith("client_tcp")
+                                         or (include_udp and n.startswith("client_udp")))))
+
+def pcap_inputs(args):
+    return run_files(args.root, lambda n: pcap_captures(n, args.include_udp))
+
+def udp_inputs(args):
+    # what udp_summary.find_run_captures picks up
+    return run_files(args.root, lambda n: n.lower() in ("bottleneck.pcap", "server.pcap") or n.endswith(".udp.bin")
+                     or (n.lower().startswith("client_udp") and n.lower().endswith(".pcap")))
+
+# plot input CSV -> image it produces
+PLOTS = {"all_scenarios_pcap.csv": "pcap_plot.png", "all_scenarios_summary.csv": "summary_plot.png"}
+
+def plot_inputs(args):
+    return [os.path.join(args.root, csv) for csv in PLOTS]
+
+def plot_outputs(args):
+    return [os.path.join(args.out_dir, png) for csv, png in PLOTS.items()
+            if os.path.exists(os.path.join(args.root, csv))]
+
+def collect_outputs(args):
+    return [os.path.join(args.root, args.scenario)] if args.scenario else []
+
+def run_collect(args):
+    if not args.scenario:
+        print("[!] collect needs --scenario")
+        return 1
+    env = dict(os.environ, SCENARIO=args.scenario, OUT_BASE=args.root, RUNS=str(args.runs))
+    return subprocess.run(["bash", os.path.join(SCRIPT_DIR, "oneflow_script.sh")], env=env).returncode
+
+def run_summarize(args):
+    import summary
+    summary.main(args.root, all_pairs=args.all_pairs)
+
+def run_pcap(args):
+    import pcap_summary
+    pcap_summary.process_all_runs(root=args.root, include_udp=args.include_udp)
+
+def run_udp(args):
+    import udp_summary
+    udp_summary.process_all_runs(root=args.root, counter_bits=64 if args.counter_64bit else 32)
+
+def run_plot(args):
+    import plot_result
+    plot_result.main(args.root, args.out_dir)
+
+# name: (depends on, inputs(args), outputs(args), run(args))
+STAGES = {
+    "collect": ([], lambda a: [], collect_outputs, run_collect),
+    "summarize": (["collect"], summarize_inputs,
+                  lambda a: [os.path.join(a.root, "all_scenarios_summary.csv")], run_summarize),
+    "pcap": (["collect"], pcap_inputs,
+             lambda a: [os.path.join(a.root, "all_scenarios_pcap.csv")], run_pcap),
+    "udp": (["collect"], udp_inputs,
+            lambda a: [os.path.join(a.root, "all_scenarios_udp.csv")], run_udp),
+    "plot": (["summarize", "pcap"], plot_inputs, plot_outputs, run_plot),
+}
+
+def stage_state(name, args):
+    """'no inputs', 'missing', 'stale' or 'up-to-date' from output vs input mtimes."""
+    _, inputs, outputs, _ = STAGES[name]
+    outs = outputs(args)
+    if name == "collect":
+        # collection has no inputs to compare against: an existing folder says
+        # nothing about whether the caller wants fresh runs, so never up-to-date
+        return "exists" if outs and all(os.path.exists(p) for p in outs) else "missing"
+    newest_in = newest_mtime(p for p in inputs(args) if os.path.exists(p))
+    if newest_in is None:
+        return "no inputs"
+    if not outs or not all(os.path.exists(p) for p in outs):
+        return "missing"
+    if newest_in is not None and newest_in > min(os.path.getmtime(p) for p in outs):
+        return "stale"
+    return "up-to-date"
+
+def pipeline(args):
+    """Stages for `all`, in dependency order."""
+    order = ["collect", "summarize", "pcap"] + (["udp"] if args.udp else []) + ["plot"]
+    return [s for s in order if s != "collect" or args.scenario]
+
+# ============================================================
+# Subcommands
+# ============================================================
+def cmd_list(args):
+    scenarios = scenario_dirs(args.root)
+    if not scenarios:
+        print(f"[!] No scenarios under {args.root}")
+        return 1
+    for name, _, runs in scenarios:
+        print(f"{name}\t{len(runs)} runs")
+    return 0
+
+def cmd_status(args):
+    for name in pipeline(args):
+        print(f"{name:<10} {stage_state(name, args)}")
+    return 0
+
+def cmd_stage(args):
+    t = time.time()
+    rc = STAGES[args.command][3](args)
+    print(f"[+] {args.command} finished in {time.time() - t:.1f}s")
+    return rc or 0
+
+def cmd_all(args):
+    ran = set()
+    for name in pipeline(args):
+        deps = STAGES[name][0]
+        state = stage_state(name, args)
+        # mtimes catch most changes; a dependency that just ran forces a rerun
+        if state == "no inputs" or (not args.force and state == "up-to-date" and not ran.intersection(deps)):
+            print(f"[=] {name}: {state}, skipped")
+            continue
+        if name == "collect":
+            state = f"{state}, collecting {args.scenario} ({args.runs} runs)"
+        elif state == "up-to-date":
+            state = f"{', '.join(sorted(ran.intersection(deps)))} just ran"
+        print(f"[>] {name}: {state if not args.force else 'forced'}")
+        t = time.time()
+        rc = STAGES[name][3](args)
+        if rc:
+            print(f"[!] {name} failed (exit {rc}), stopping")
+            return rc
+        print(f"[+] {name} finished in {time.time() - t:.1f}s")
+        ran.add(name)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NT531 experiment pipeline")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help=f"experiments folder (default: {DEFAULT_ROOT})")
+    parser.add_argument("--out-dir", default=".", help="where plots are written (default: current folder)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="list scenarios and their run counts")
+    p = sub.add_parser("status", help="show which stage outputs are up to date")
+    p.add_argument("--scenario", default=None)
+    p.add_argument("--udp", action="store_true", help="include the udp stage")
+
+    p = sub.add_parser("collect", help="run oneflow_script.sh for one scenario")
+    p.add_argument("--scenario", required=True)
+    p.add_argument("--runs", type=int, default=3)
+    p = sub.add_parser("summarize", help="iperf3/ifstat summary with CIs and pfifo/RED comparisons")
+    p.add_argument("--all-pairs", action="store_true", help="compare every scenario pair, not only pfifo vs RED")
+    p = sub.add_parser("pcap", help="pcap metrics (tshark)")
+    p.add_argument("--include-udp", action="store_true", help="also process client_udp_*.pcap files")
+    p = sub.add_parser("udp", help="per-packet UDP loss/jitter from iperf3 headers")
+    p.add_argument("--counter-64bit", action="store_true", help="iperf3 was run with --udp-counters-64bit")
+    sub.add_parser("plot", help="draw pcap_plot.png and summary_plot.png")
+
+    p = sub.add_parser("all", help="run every out-of-date stage in dependency order")
+    p.add_argument("--scenario", default=None,
+                   help="collect this scenario first (always runs, overwriting existing runs)")
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--udp", action="store_true", help="include the udp stage")
+    p.add_argument("--include-udp", action="store_true", help="pcap stage: also process client_udp_*.pcap")
+    p.add_argument("--counter-64bit", action="store_true")
+    p.add_argument("--force", action="store_true", help="rerun stages even if up to date")
+
+    args = parser.parse_args(argv)
+    # stage functions read these regardless of which subcommand set them
+    for name, default in (("scenario", None), ("runs", 3), ("udp", False),
+                          ("include_udp", False), ("counter_64bit", False), ("all_pairs", False)):
+        if not hasattr(args, name):
+            setattr(args, name, default)
+
+    handlers = {"list": cmd_list, "status": cmd_status, "all": cmd_all}
+    return handlers.get(args.command, cmd_stage)(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
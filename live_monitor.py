@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Live monitor for a run directory while oneflow_script.sh is writing it.
+
+Tails ss_client.txt, ifstat_client_*.log and the iperf3 output files,
+keeps rolling-window throughput / RTT / cwnd / retransmission / loss
+figures and flags anomalies (collector not started, iperf3 error, stalled
+or implausibly fast traffic) so a bad run can be aborted early.
+
+Standard library only, so it starts fast and stays cheap on the client.
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import signal
+import asyncio
+import argparse
+import subprocess
+from collections import deque
+
+SERVER_IP = "192.168.60.20"
+IPERF_PORT = 5201
+
+POLL_S = 0.5            # how often each file is checked for new bytes
+WINDOW_S = 5.0          # rolling window length
+MAX_SAMPLES = 256       # hard cap per window (bounded memory)
+STARTUP_GRACE_S = 5.0   # collectors must have written something by then
+STALL_S = 5.0           # no traffic for this long while iperf3 runs -> anomaly
+ABORT_FILE = "monitor_abort.txt"
+
+RE_RTT = re.compile(r"\brtt:([0-9.]+)/")
+RE_CWND = re.compile(r"\bcwnd:(\d+)")
+RE_RETRANS = re.compile(r"\bretrans:\d+/(\d+)")
+
+# ============================================================
+# Bounded rolling window
+# ============================================================
+class RollingWindow:
+    """Time-based window over (t, value) samples, capped at MAX_SAMPLES."""
+
+    def __init__(self, window_s=WINDOW_S, maxlen=MAX_SAMPLES):
+        self.window_s = window_s
+        self.samples = deque(maxlen=maxlen)
+        self.total = 0.0
+
+    def add(self, value, now=None):
+        now = time.monotonic() if now is None else now
+        if len(self.samples) == self.samples.maxlen:
+            self.total -= self.samples[0][1]
+        self.samples.append((now, value))
+        self.total += value
+        self._evict(now)
+
+    def _evict(self, now):
+        while self.samples and self.samples[0][0] < now - self.window_s:
+            self.total -= self.samples.popleft()[1]
+
+    def mean(self, now=None):
+        self._evict(time.monotonic() if now is None else now)
+        return self.total / len(self.samples) if self.samples else None
+
+# ============================================================
+# Incremental file tail
+# ============================================================
+class Tail:
+    """Return complete new lines from a growing file; partial lines are kept."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.partial = b""
+        self.last_growth = None
+
+    def read_lines(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        if size < self.offset:          # truncated / recreated
+            self.offset, self.partial = 0, b""
+        if size == self.offset:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        self.offset += len(chunk)
+        self.last_growth = time.monotonic()
+        data = self.partial + chunk
+        lines = data.split(b"\n")
+        self.partial = lines.pop()
+        return [l.decode("utf-8", "replace") for l in lines]
+
+# ============================================================
+# Monitor state + parsers
+# ============================================================
+class RunMonitor:
+    def __init__(self, run_dir, server_ip=SERVER_IP, min_mbps=0.0, max_mbps=None,
+                 max_rtt_ms=None, window_s=WINDOW_S):
+        self.run_dir = run_dir
+        self.server_ip = server_ip
+        self.min_mbps = min_mbps
+        self.max_mbps = max_mbps
+        self.max_rtt_ms = max_rtt_ms
+        self.started = time.monotonic()
+
+        self.tx_mbps = RollingWindow(window_s)
+        self.rtt_ms = RollingWindow(window_s)
+        self.cwnd = RollingWindow(window_s)
+        self.retrans_rate = RollingWindow(window_s)
+        self.udp_loss_pct = RollingWindow(window_s)
+        self.iperf_mbps = RollingWindow(window_s)
+
+        self.tails = {}
+        self.anomalies = {}             # kind -> first message (one entry per kind)
+        self.iperf_running = set()      # iperf3 outputs opened but not yet complete
+        self.last_traffic = None
+        self._ss_sample = None          # (rtts, cwnds, retrans_total) of the dump being read
+        self._ss_prev_retrans = None
+        self._ss_prev_t = None
+        self._peer_is_server = False
+
+    @property
+    def iperf_active(self):
+        return bool(self.iperf_running)
+
+    # ---- anomalies ----
+    def flag(self, kind, reason):
+        # messages carry live numbers, so de-duplicate on the kind
+        if kind in self.anomalies:
+            return
+        self.anomalies[kind] = reason
+        print(f"[!] {reason}", flush=True)
+
+    # ---- ss -tinm ----
+    def parse_ss(self, lines):
+        for line in lines:
+            if not line.startswith((" ", "\t")):
+                # connection line; a new dump starts with the State header
+                if line.startswith("State"):
+                    self._flush_ss()
+                self._peer_is_server = f"{self.server_ip}:{IPERF_PORT}" in line
+                continue
+            if not self._peer_is_server or "rtt:" not in line:
+                continue
+            if self._ss_sample is None:
+                self._ss_sample = ([], [], 0)
+            rtts, cwnds, retrans = self._ss_sample
+            m = RE_RTT.search(line)
+            if m:
+                rtts.append(float(m.group(1)))
+            m = RE_CWND.search(line)
+            if m:
+                cwnds.append(int(m.group(1)))
+            m = RE_RETRANS.search(line)
+            self._ss_sample = (rtts, cwnds, retrans + (int(m.group(1)) if m else 0))
+
+    def _flush_ss(self):
+        if self._ss_sample is None:
+            return
+        rtts, cwnds, retrans = self._ss_sample
+        self._ss_sample = None
+        now = time.monotonic()
+        if rtts:
+            self.rtt_ms.add(sum(rtts) / len(rtts), now)
+        if cwnds:
+            self.cwnd.add(sum(cwnds) / len(cwnds), now)
+        if self._ss_prev_retrans is not None and retrans >= self._ss_prev_retrans:
+            self.retrans_rate.add((retrans - self._ss_prev_retrans) / max(now - self._ss_prev_t, 1e-3), now)
+        self._ss_prev_retrans, self._ss_prev_t = retrans, now
+
+    # ---- ifstat -t 1 ----
+    def parse_ifstat(self, lines):
+        for line in lines:
+            if not re.match(r"^\s*\d", line):
+                continue
+            parts = line.split()
+            if len(parts) < 3:
+                continue
+            try:
+                tx_kBps = float(parts[2])
+            except ValueError:
+                continue
+            mbps = tx_kBps * 8 / 1000
+            self.tx_mbps.add(mbps)
+            if mbps > 0.01:
+                self.last_traffic = time.monotonic()
+
+    # ---- iperf3 (-J or --json-stream) ----
+    def parse_iperf(self, name, lines):
+        # -J writes the whole document when the test ends; --json-stream
+        # writes one event per line as it goes.
+        for line in lines:
+            s = line.strip()
+            if line.rstrip() == "}":
+                # closing brace of a -J document
+                self.iperf_running.discard(name)
+                continue
+            if s.startswith('{"event"'):
+                try:
+                    event = json.loads(s)
+                except ValueError:
+                    continue
+                kind = event.get("event")
+                if kind == "start":
+                    self.iperf_running.add(name)
+                elif kind == "interval":
+                    total = event.get("data", {}).get("sum", {})
+                    if "bits_per_second" in total:
+                        self.iperf_mbps.add(total["bits_per_second"] / 1e6)
+                elif kind == "end":
+                    # the client only learns UDP loss from the server's final report
+                    total = event.get("data", {}).get("sum", {})
+                    if "lost_percent" in total:
+                        self.udp_loss_pct.add(total["lost_percent"])
+                    self.iperf_running.discard(name)
+                elif kind == "error":
+                    self.flag(f"iperf_error:{name}", f"iperf3 error in {name}: {event.get('data')}")
+            elif s.startswith('"error"'):
+                self.flag(f"iperf_error:{name}", f"iperf3 error in {name}: {s.split(':', 1)[1].strip().rstrip(',')}")
+
+    # ---- checks ----
+    def check(self):
+        now = time.monotonic()
+        age = now - self.started
+        if age > STARTUP_GRACE_S:
+            ss = self.tails.get("ss")
+            if ss is None or ss.last_growth is None:
+                self.flag("ss_missing", "ss collector not started (ss_client.txt missing or empty)")
+            if not any(k.startswith("ifstat") and t.last_growth for k, t in self.tails.items()):
+                self.flag("ifstat_missing", "ifstat collector not started (no ifstat_client_*.log output)")
+
+        if self.iperf_active and age > STARTUP_GRACE_S:
+            last = self.last_traffic or self.started
+            if now - last > STALL_S:
+                self.flag("stall", f"no client traffic for {now - last:.0f}s while iperf3 is running")
+
+        tx = self.tx_mbps.mean(now)
+        if tx is not None and self.iperf_active:
+            # the ceiling is the bottleneck rate for TCP; UDP with -b 0 sends
+            # at line rate on the client side by design
+            if self.max_mbps is not None and tx > self.max_mbps and "tcp.json" in self.iperf_running:
+                self.flag("above_ceiling", f"client tx {tx:.1f} Mbps above expected ceiling {self.max_mbps} Mbps "
+                          "(bottleneck qdisc not applied?)")
+            if self.min_mbps and tx < self.min_mbps:
+                self.flag("below_floor", f"client tx {tx:.2f} Mbps below floor {self.min_mbps} Mbps")
+        rtt = self.rtt_ms.mean(now)
+        if rtt is not None and self.max_rtt_ms is not None and rtt > self.max_rtt_ms:
+            self.flag("rtt", f"rolling RTT {rtt:.1f} ms above {self.max_rtt_ms} ms")
+
+    def status(self):
+        def fmt(v, spec):
+            return "-" if v is None else format(v, spec)
+        return (f"[live] t={time.monotonic() - self.started:5.1f}s "
+                f"tx={fmt(self.tx_mbps.mean(), '.2f')}Mbps "
+                f"iperf={fmt(self.iperf_mbps.mean(), '.2f')}Mbps "
+                f"rtt={fmt(self.rtt_ms.mean(), '.1f')}ms "
+                f"cwnd={fmt(self.cwnd.mean(), '.1f')} "
+                f"retrans/s={fmt(self.retrans_rate.mean(), '.1f')} "
+                f"udp_loss={fmt(self.udp_loss_pct.mean(), '.1f')}%")
+
+    # ---- file discovery ----
+    def discover(self):
+        wanted = {"ss": os.path.join(self.run_dir, "ss_client.txt")}
+        for path in glob.glob(os.path.join(self.run_dir, "ifstat_client_*.log")):
+            wanted["ifstat:" + os.path.basename(path)] = path
+        for name in ("tcp.json", "udp.json"):
+            wanted["iperf:" + name] = os.path.join(self.run_dir, name)
+        for key, path in wanted.items():
+            if key not in self.tails and os.path.exists(path):
+                self.tails[key] = Tail(path)
+                if key.startswith("iperf:"):
+                    # the shell creates the file when iperf3 starts
+                    self.iperf_running.add(key.split(":", 1)[1])
+
+    def poll(self):
+        self.discover()
+        for key, tail in self.tails.items():
+            lines = tail.read_lines()
+            if not lines:
+                continue
+            if key == "ss":
+                self.parse_ss(lines)
+            elif key.startswith("ifstat:"):
+                self.parse_ifstat(lines)
+            else:
+                self.parse_iperf(key.split(":", 1)[1], lines)
+
+# ============================================================
+# Abort handling
+# ============================================================
+def write_abort(run_dir, reasons):
+    path = os.path.join(run_dir, ABORT_FILE)
+    with open(path, "w") as f:
+        f.write("\n".join(reasons) + "\n")
+    print(f"[!] Wrote {path}", flush=True)
+
+def abort_iperf():
+    # SIGINT makes the iperf3 client stop and still emit its (partial) JSON
+    subprocess.run(["pkill", "-INT", "-x", "iperf3"], check=False)
+
+# ============================================================
+# Main loop
+# ============================================================
+async def monitor(mon, report_s, abort_on_anomaly, kill_iperf, stop):
+    next_report = time.monotonic() + report_s
+    while not stop.is_set():
+        mon.poll()
+        mon.check()
+        if mon.anomalies and abort_on_anomaly:
+            write_abort(mon.run_dir, list(mon.anomalies.values()))
+            if kill_iperf:
+                abort_iperf()
+            return 2
+        if report_s and time.monotonic() >= next_report:
+            print(mon.status(), flush=True)
+            next_report += report_s
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=POLL_S)
+        except asyncio.TimeoutError:
+            pass
+    mon.poll()
+    print(mon.status(), flush=True)
+    return 1 if mon.anomalies else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Live rolling metrics for a run in progress")
+    parser.add_argument("run_dir", help="run output folder being written by oneflow_script.sh")
+    parser.add_argument("--server-ip", default=SERVER_IP)
+    parser.add_argument("--window", type=float, default=WINDOW_S, help="rolling window in seconds")
+    parser.add_argument("--report", type=float, default=2.0, help="status line interval in seconds (0 = off)")
+    parser.add_argument("--min-mbps", type=float, default=0.0, help="flag client tx below this while iperf3 runs")
+    parser.add_argument("--max-mbps", type=float, default=None,
+                        help="flag client tx above this during the TCP test "
+                             "(e.g. bottleneck rate, catches a missing qdisc)")
+    parser.add_argument("--max-rtt-ms", type=float, default=None, help="flag rolling RTT above this")
+    parser.add_argument("--abort", action="store_true",
+                        help=f"on the first anomaly write {ABORT_FILE} and exit with status 2")
+    parser.add_argument("--kill-iperf", action="store_true", help="with --abort, also SIGINT the iperf3 client")
+    args = parser.parse_args()
+
+    os.makedirs(args.run_dir, exist_ok=True)
+    mon = RunMonitor(args.run_dir, server_ip=args.server_ip, min_mbps=args.min_mbps,
+                     max_mbps=args.max_mbps, max_rtt_ms=args.max_rtt_ms, window_s=args.window)
+
+    async def runner():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        return await monitor(mon, args.report, args.abort, args.kill_iperf, stop)
+
+    sys.exit(asyncio.run(runner()))
+
+if __name__ == "__main__":
+    main()
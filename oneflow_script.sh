@@ -7,9 +7,9 @@
 USER="root"                           # đổi nếu cần
 SERVER_IP="192.168.60.20"
 BOTTLENECK_IP="192.168.50.1"
-RUNS=3
-SCENARIO="bwNORMAL_multiflow_pfifo"
-OUT_BASE="experiments"
+RUNS="${RUNS:-3}"
+SCENARIO="${SCENARIO:-bwNORMAL_multiflow_pfifo}"
+OUT_BASE="${OUT_BASE:-experiments}"
 TCP_TIME=15
 UDP_TIME=15
 UDP_BW="0"                            # "0" = as-fast-as-possible; hoặc "100M"
@@ -19,6 +19,15 @@ CLIENT_IF="enp0s8"
 SERVER_IF="enp0s8"
 BOTTLENECK_IF="enp0s9"
 SSH_OPTS="-o BatchMode=yes -o ConnectTimeout=8"
+SNAPLEN=128                           # chỉ giữ header (đủ cho TCP options + header UDP của iperf3); 0 = full packet
+ROTATE_SECONDS=0                      # xoay file pcap mỗi N giây (vd. 5) và xử lý dần bằng segment_consumer.py; 0 = một file duy nhất như trước
+ROTATE_MB=0                           # xoay thêm theo kích thước (MB) khi ROTATE_SECONDS > 0; 0 = tắt
+DISCARD_SEGMENTS=0                    # 1 = xoá segment sau khi segment_consumer.py đã gộp xong (mất pcap gốc, chỉ còn *.partial.json + *.udp.bin)
+REMOTE_CONSUMER=0                     # 1 = chạy segment_consumer.py trên bottleneck/server (cần python3+pandas+tshark);
+                                      # 0 = segment bottleneck/server vẫn nằm trên đĩa đến hết run rồi mới được copy và xử lý
+LIVE_MONITOR=1                        # 1 = chạy live_monitor.py trong lúc đo
+MONITOR_ARGS="--abort --kill-iperf"   # thêm --max-mbps 3.5 cho scenario bw3Mbps để bắt qdisc sai (chỉ xét lúc chạy TCP)
+IPERF_JSON="auto"                     # auto = --json-stream nếu iperf3 hỗ trợ (>= 3.17, live_monitor đọc được từng interval), không thì -J
 # ---- END CONFIG ----
 
 set -u
@@ -26,10 +35,68 @@ mkdir -p "${OUT_BASE}"
 mkdir -p "${OUT_BASE}/${SCENARIO}"
 
 timestamp() { date +"%F %T"; }
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+if [ "$IPERF_JSON" = "auto" ]; then
+  if iperf3 --help 2>&1 | grep -q -- "--json-stream"; then IPERF_JSON="--json-stream"; else IPERF_JSON="-J"; fi
+fi
+echo "$(timestamp) [MAIN] iperf3 output format: ${IPERF_JSON}"
+
+# tcpdump options: snaplen + rotation. capture_target DIR PREFIX prints the -w part.
+TCPDUMP_OPTS=""
+[ "$SNAPLEN" != "0" ] && TCPDUMP_OPTS="-s ${SNAPLEN}"
+capture_target() {
+  if [ "$ROTATE_SECONDS" != "0" ]; then
+    local opts="-G ${ROTATE_SECONDS} -Z ${USER}"
+    [ "$ROTATE_MB" != "0" ] && opts="${opts} -C ${ROTATE_MB}"
+    echo "${opts} -w ${1}/${2}_%Y%m%d_%H%M%S.pcap"
+  else
+    echo "-w ${1}/${2}.pcap"
+  fi
+}
+CONSUMER_ARGS=""
+[ "$DISCARD_SEGMENTS" = "1" ] && CONSUMER_ARGS="--discard"
+CONSUMER_FILES="segment_consumer.py pcap_summary.py udp_summary.py"
+
+# start_remote_consumer HOST: copy the analysis scripts and consume segments in REMOTE_TMP as they close
+start_remote_consumer() {
+  for f in ${CONSUMER_FILES}; do
+    scp -q -o ConnectTimeout=8 "${SCRIPT_DIR}/${f}" ${USER}@${1}:"${REMOTE_TMP}/" || return 1
+  done
+  ssh $SSH_OPTS ${USER}@${1} "
+    cd ${REMOTE_TMP} && nohup nice -n 10 python3 segment_consumer.py ${REMOTE_TMP} ${CONSUMER_ARGS} > ${REMOTE_TMP}/segment_consumer.log 2>&1 < /dev/null & echo \$! > ${REMOTE_TMP}/segment_consumer.pid
+  "
+}
+
+# stop_remote_consumer HOST: SIGTERM makes it merge the last segment; wait for that before copying
+stop_remote_consumer() {
+  ssh $SSH_OPTS ${USER}@${1} "
+    [ -f ${REMOTE_TMP}/segment_consumer.pid ] || exit 0
+    pid=\$(cat ${REMOTE_TMP}/segment_consumer.pid)
+    kill -TERM \$pid 2>/dev/null || true
+    while kill -0 \$pid 2>/dev/null; do sleep 0.2; done
+  "
+}
+
+# copy_capture HOST PREFIX: partial aggregates + UDP header records if consumed remotely, else the pcap(s)
+copy_capture() {
+  if [ "$ROTATE_SECONDS" != "0" ] && [ "$REMOTE_CONSUMER" = "1" ]; then
+    scp -o ConnectTimeout=8 ${USER}@${1}:"${REMOTE_TMP}/${2}.partial.json" "${OUTDIR}/" || return 1
+    # only written when the capture contained iperf3 UDP datagrams
+    scp -q -o ConnectTimeout=8 ${USER}@${1}:"${REMOTE_TMP}/${2}.udp.bin" "${OUTDIR}/" 2>/dev/null || true
+  else
+    scp -o ConnectTimeout=8 ${USER}@${1}:"${REMOTE_TMP}/${2}*.pcap*" "${OUTDIR}/"
+  fi
+}
 
 for run in $(seq 1 "$RUNS"); do
   OUTDIR="${OUT_BASE}/${SCENARIO}/${SCENARIO}_run_${run}"
   mkdir -p "$OUTDIR"
+  # verdict of an earlier collection into this folder must not skip this run's UDP test
+  rm -f "${OUTDIR:?}/monitor_abort.txt"
+  # segment state/records and segments of an earlier collection would be merged into this run
+  rm -f "${OUTDIR:?}"/*.partial.json "${OUTDIR:?}"/*.partial.json.tmp "${OUTDIR:?}"/*.udp.bin
+  rm -f "${OUTDIR:?}"/*_[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]_[0-9][0-9][0-9][0-9][0-9][0-9].pcap*
   REMOTE_TMP="/tmp/exp_${SCENARIO}_run${run}"
 
   echo "$(timestamp) [MAIN] Starting run ${run}, output -> ${OUTDIR}"
@@ -40,7 +107,7 @@ for run in $(seq 1 "$RUNS"); do
     rm -rf ${REMOTE_TMP} 2>/dev/null || true
     mkdir -p ${REMOTE_TMP}
     sudo pkill tcpdump || true
-  sudo nohup tcpdump -i ${BOTTLENECK_IF} -w ${REMOTE_TMP}/bottleneck.pcap >/dev/null 2>&1 < /dev/null & echo \$! > ${REMOTE_TMP}/bottleneck_tcpdump.pid
+  sudo nohup tcpdump -i ${BOTTLENECK_IF} ${TCPDUMP_OPTS} $(capture_target ${REMOTE_TMP} bottleneck) >/dev/null 2>&1 < /dev/null & echo \$! > ${REMOTE_TMP}/bottleneck_tcpdump.pid
     nohup ifstat -i ${BOTTLENECK_IF} -t 1 > ${REMOTE_TMP}/ifstat_bottleneck_${BOTTLENECK_IF}.log 2>&1 < /dev/null & echo \$! > ${REMOTE_TMP}/ifstat_bottleneck.pid
   " || echo "$(timestamp) [WARN] SSH to bottleneck failed"
 
@@ -50,7 +117,7 @@ for run in $(seq 1 "$RUNS"); do
     rm -rf ${REMOTE_TMP} 2>/dev/null || true
     mkdir -p ${REMOTE_TMP}
     sudo pkill tcpdump || true
-  sudo nohup tcpdump -i ${SERVER_IF} -w ${REMOTE_TMP}/server.pcap >/dev/null 2>&1 < /dev/null & echo \$! > ${REMOTE_TMP}/server_tcpdump.pid
+  sudo nohup tcpdump -i ${SERVER_IF} ${TCPDUMP_OPTS} $(capture_target ${REMOTE_TMP} server) >/dev/null 2>&1 < /dev/null & echo \$! > ${REMOTE_TMP}/server_tcpdump.pid
 
     # start iperf3 server
     pkill iperf3 || true
@@ -68,33 +135,58 @@ for run in $(seq 1 "$RUNS"); do
     fi
   " || echo "$(timestamp) [WARN] SSH to server failed"
 
+  if [ "$ROTATE_SECONDS" != "0" ] && [ "$REMOTE_CONSUMER" = "1" ]; then
+    echo "$(timestamp) [REMOTE] Start segment consumers on bottleneck and server"
+    start_remote_consumer ${BOTTLENECK_IP} || echo "$(timestamp) [WARN] bottleneck segment consumer failed to start"
+    start_remote_consumer ${SERVER_IP} || echo "$(timestamp) [WARN] server segment consumer failed to start"
+  fi
+
   echo "$(timestamp) [CLIENT] Start local collectors (ss, ifstat) and continuous tcpdump"
   nohup bash -c "while true; do ss -tinm >> \"${OUTDIR}/ss_client.txt\"; sleep 1; done" & CLIENT_SS_PID=$!
   nohup ifstat -i ${CLIENT_IF} -t 1 > "${OUTDIR}/ifstat_client_${CLIENT_IF}.log" 2>&1 < /dev/null & CLIENT_IFSTAT_PID=$!
 
   # Start continuous tcpdump on client (capture all protocols) -> client_all.pcap
+  # (or client_all_<time>.pcap segments when ROTATE_SECONDS > 0)
   # Use sudo if not running as root
   sudo pkill tcpdump || true
-  nohup sudo tcpdump -i ${CLIENT_IF} -w "${OUTDIR}/client_all.pcap" >/dev/null 2>&1 < /dev/null & CLIENT_TCPDUMP_PID=$!
+  nohup sudo tcpdump -i ${CLIENT_IF} ${TCPDUMP_OPTS} $(capture_target "${OUTDIR}" client_all) >/dev/null 2>&1 < /dev/null & CLIENT_TCPDUMP_PID=$!
+  CLIENT_CONSUMER_PID=""
+  if [ "$ROTATE_SECONDS" != "0" ]; then
+    nohup nice -n 10 python3 "${SCRIPT_DIR}/segment_consumer.py" "${OUTDIR}" ${CONSUMER_ARGS} > "${OUTDIR}/segment_consumer.log" 2>&1 < /dev/null & CLIENT_CONSUMER_PID=$!
+  fi
+  MONITOR_PID=""
+  if [ "$LIVE_MONITOR" = "1" ]; then
+    # nice: giữ CPU của client cho phép đo
+    nice -n 10 python3 "${SCRIPT_DIR}/live_monitor.py" "${OUTDIR}" ${MONITOR_ARGS} > "${OUTDIR}/live_monitor.log" 2>&1 < /dev/null & MONITOR_PID=$!
+  fi
   sleep 1   # chờ iperf3 server sẵn sàng
 
   echo "$(timestamp) [TEST] Running TCP iperf3 (client -> ${SERVER_IP}) for ${TCP_TIME}s"
-  iperf3 -c ${SERVER_IP} -P ${TCP_FLOWS} -t ${TCP_TIME} -J > "${OUTDIR}/tcp.json" || echo "$(timestamp) [WARN] iperf3 TCP returned non-zero"
+  iperf3 -c ${SERVER_IP} -P ${TCP_FLOWS} -t ${TCP_TIME} ${IPERF_JSON} > "${OUTDIR}/tcp.json" || echo "$(timestamp) [WARN] iperf3 TCP returned non-zero"
 
+  if [ -f "${OUTDIR}/monitor_abort.txt" ]; then
+  echo "$(timestamp) [WARN] Live monitor flagged this run, skipping UDP test: $(head -n1 "${OUTDIR}/monitor_abort.txt")"
+  else
   echo "$(timestamp) [TEST] Running UDP iperf3 (client -> ${SERVER_IP}) for ${UDP_TIME}s bw=${UDP_BW}"
   if [ "$UDP_BW" = "0" ]; then
-  iperf3 -c ${SERVER_IP} -u -b 0 -P ${UDP_FLOWS} -t ${UDP_TIME} -J > "${OUTDIR}/udp.json" || echo "$(timestamp) [WARN] iperf3 UDP returned non-zero"
+  iperf3 -c ${SERVER_IP} -u -b 0 -P ${UDP_FLOWS} -t ${UDP_TIME} ${IPERF_JSON} > "${OUTDIR}/udp.json" || echo "$(timestamp) [WARN] iperf3 UDP returned non-zero"
   else
-  iperf3 -c ${SERVER_IP} -u -b ${UDP_BW} -P ${UDP_FLOWS} -t ${UDP_TIME} -J > "${OUTDIR}/udp.json" || echo "$(timestamp) [WARN] iperf3 UDP returned non-zero"
+  iperf3 -c ${SERVER_IP} -u -b ${UDP_BW} -P ${UDP_FLOWS} -t ${UDP_TIME} ${IPERF_JSON} > "${OUTDIR}/udp.json" || echo "$(timestamp) [WARN] iperf3 UDP returned non-zero"
+  fi
   fi
 
   echo "$(timestamp) [CLIENT] Stopping local collectors..."
-  kill ${CLIENT_SS_PID} ${CLIENT_IFSTAT_PID} 2>/dev/null || true
+  kill ${CLIENT_SS_PID} ${CLIENT_IFSTAT_PID} ${MONITOR_PID} 2>/dev/null || true
 
   # Stop client tcpdump after tests
   echo "$(timestamp) [CLIENT] Stopping client tcpdump (continuous)"
   sudo kill ${CLIENT_TCPDUMP_PID} 2>/dev/null || true
   sleep 0.5
+  if [ -n "$CLIENT_CONSUMER_PID" ]; then
+    # SIGTERM: merge the last (now closed) segment, then exit
+    kill -TERM ${CLIENT_CONSUMER_PID} 2>/dev/null || true
+    wait ${CLIENT_CONSUMER_PID} 2>/dev/null || true
+  fi
 
   echo "$(timestamp) [SERVER] Stopping remote collectors and changing ownership (if needed)..."
   ssh $SSH_OPTS ${USER}@${SERVER_IP} "
@@ -103,20 +195,22 @@ for run in $(seq 1 "$RUNS"); do
     [ -f ${REMOTE_TMP}/server_tcpdump.pid ] && sudo kill \$(cat ${REMOTE_TMP}/server_tcpdump.pid) 2>/dev/null || true || true
     [ -f ${REMOTE_TMP}/ifstat_server.pid ] && kill \$(cat ${REMOTE_TMP}/ifstat_server.pid) 2>/dev/null || true
     [ -f ${REMOTE_TMP}/ss_server.pid ] && kill \$(cat ${REMOTE_TMP}/ss_server.pid) 2>/dev/null || true
-    sudo chown ${USER}:${USER} ${REMOTE_TMP}/server.pcap 2>/dev/null || true
+    sudo chown ${USER}:${USER} ${REMOTE_TMP}/server*.pcap* 2>/dev/null || true
   " || echo "$(timestamp) [WARN] SSH to server stop failed"
+  [ "$ROTATE_SECONDS" != "0" ] && [ "$REMOTE_CONSUMER" = "1" ] && stop_remote_consumer ${SERVER_IP}
 
   echo "$(timestamp) [BOTTLENECK] Stopping remote collectors and changing ownership..."
   ssh $SSH_OPTS ${USER}@${BOTTLENECK_IP} "
     set -u
     [ -f ${REMOTE_TMP}/bottleneck_tcpdump.pid ] && sudo kill \$(cat ${REMOTE_TMP}/bottleneck_tcpdump.pid) 2>/dev/null || true
     [ -f ${REMOTE_TMP}/ifstat_bottleneck.pid ] && kill \$(cat ${REMOTE_TMP}/ifstat_bottleneck.pid) 2>/dev/null || true
-    sudo chown ${USER}:${USER} ${REMOTE_TMP}/bottleneck.pcap 2>/dev/null || true
+    sudo chown ${USER}:${USER} ${REMOTE_TMP}/bottleneck*.pcap* 2>/dev/null || true
   " || echo "$(timestamp) [WARN] SSH to bottleneck stop failed"
+  [ "$ROTATE_SECONDS" != "0" ] && [ "$REMOTE_CONSUMER" = "1" ] && stop_remote_consumer ${BOTTLENECK_IP}
 
   echo "$(timestamp) [COPY] Copying pcaps and logs to ${OUTDIR}..."
-  scp -o ConnectTimeout=8 ${USER}@${BOTTLENECK_IP}:"${REMOTE_TMP}/bottleneck.pcap" "${OUTDIR}/" || echo "$(timestamp) [WARN] scp bottleneck failed"
-  scp -o ConnectTimeout=8 ${USER}@${SERVER_IP}:"${REMOTE_TMP}/server.pcap" "${OUTDIR}/" || echo "$(timestamp) [WARN] scp server pcap failed"
+  copy_capture ${BOTTLENECK_IP} bottleneck || echo "$(timestamp) [WARN] scp bottleneck failed"
+  copy_capture ${SERVER_IP} server || echo "$(timestamp) [WARN] scp server pcap failed"
   scp -o ConnectTimeout=8 ${USER}@${SERVER_IP}:"${REMOTE_TMP}/iperf3_server.log" "${OUTDIR}/" || echo "$(timestamp) [WARN] scp server log failed"
   scp -o ConnectTimeout=8 ${USER}@${SERVER_IP}:"${REMOTE_TMP}/ss_server.txt" "${OUTDIR}/" || true
   scp -o ConnectTimeout=8 ${USER}@${SERVER_IP}:"${REMOTE_TMP}/ifstat_server_${SERVER_IF}.log" "${OUTDIR}/" || true
@@ -126,8 +220,16 @@ for run in $(seq 1 "$RUNS"); do
   ssh $SSH_OPTS ${USER}@${SERVER_IP} "rm -rf ${REMOTE_TMP}" 2>/dev/null || true
   ssh $SSH_OPTS ${USER}@${BOTTLENECK_IP} "rm -rf ${REMOTE_TMP}" 2>/dev/null || true
 
+  # Rotated captures: merge whatever segments are still unprocessed (copied remote ones)
+  if [ "$ROTATE_SECONDS" != "0" ]; then
+    echo "$(timestamp) [POST] Merging remaining capture segments"
+    python3 "${SCRIPT_DIR}/segment_consumer.py" "${OUTDIR}" --final ${CONSUMER_ARGS} >> "${OUTDIR}/segment_consumer.log" 2>&1 || echo "$(timestamp) [WARN] segment consumer failed"
+  fi
+
   # Post-processing: tách TCP / UDP từ client_all.pcap để có file riêng nếu cần
-  if [ -f "${OUTDIR}/client_all.pcap" ]; then
+  if [ "$ROTATE_SECONDS" != "0" ]; then
+    :   # client segments were already reduced to client_all.partial.json + client_all.udp.bin
+  elif [ -f "${OUTDIR}/client_all.pcap" ]; then
     echo "$(timestamp) [POST] Splitting client_all.pcap -> client_tcp_5201.pcap & client_udp_5201.pcap"
     # only keep tcp/udp for port 5201
     tcpdump -r "${OUTDIR}/client_all.pcap" 'tcp and port 5201' -w "${OUTDIR}/client_tcp_5201.pcap" 2>/dev/null || true
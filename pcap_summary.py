@@ -1,16 +1,24 @@
 #!/usr/bin/env python3
+import io
 import os
+import csv
 import re
+import json
 import argparse
 import pandas as pd
 import subprocess
 
 CLIENT_IP = "192.168.50.10"
 SERVER_IP = "192.168.60.20"
+IPERF_PORT = 5201
 
 # By default we do not process UDP client captures unless --include-udp is set
+# (frame gaps only; per-packet UDP loss/jitter lives in udp_summary.py)
 PROCESS_UDP_DEFAULT = False
 
+# Columns finalize_udp_partial adds to rows of segment-consumed captures
+UDP_COUNTER_COLUMNS = ["udp_received", "udp_expected", "udp_lost_pct"]
+
 # ============================================================
 # Helper: Run tshark and return DataFrame of numeric fields
 # ============================================================
@@ -31,27 +39,33 @@ def tshark_fields(pcap, fields, display_filter):
     except subprocess.CalledProcessError:
         return pd.DataFrame()
 
+# ============================================================
+# Determine node role and tshark TCP filter from a pcap name
+# ============================================================
+def pcap_role(fname):
+    fname_l = fname.lower()
+    if "client" in fname_l:
+        tcp_filter = f"tcp and (ip.src=={CLIENT_IP} or ip.dst=={SERVER_IP})"
+        # client_all*.pcap is the unsplit capture; keep only the iperf3 port
+        if "client_all" in fname_l:
+            tcp_filter += f" and tcp.port=={IPERF_PORT}"
+        return "client", tcp_filter
+    if "server" in fname_l:
+        return "server", f"tcp and (ip.src=={SERVER_IP} or ip.dst=={CLIENT_IP})"
+    return "bottleneck", "tcp"
+
 # ============================================================
 # Summarize one PCAP with role-based metrics
 # ============================================================
 def summarize_pcap_metrics(pcap_path):
     fname = os.path.basename(pcap_path)
-    fname_l = fname.lower()
     summary = {"pcap": fname}
 
     if not os.path.exists(pcap_path) or os.path.getsize(pcap_path) == 0:
         return None
 
     # Determine role and tshark filter (use lower-case name checks)
-    if "client" in fname_l:
-        tcp_filter = f"tcp and (ip.src=={CLIENT_IP} or ip.dst=={SERVER_IP})"
-        role = "client"
-    elif "server" in fname_l:
-        tcp_filter = f"tcp and (ip.src=={SERVER_IP} or ip.dst=={CLIENT_IP})"
-        role = "server"
-    else:
-        tcp_filter = "tcp"
-        role = "bottleneck"
+    role, tcp_filter = pcap_role(fname)
 
     # ==============================
     # Metrics by node type
@@ -124,6 +138,142 @@ def summarize_pcap_metrics(pcap_path):
 
     return summary
 
+# ============================================================
+# Mergeable partial aggregates (one capture segment at a time)
+# ============================================================
+def empty_partial(role):
+    return {
+        "role": role,
+        "n_frames": 0, "t_first": None, "t_last": None,
+        "n_acks": 0, "ack_first": None, "ack_last": None,
+        "rtt_n": 0, "rtt_sum": 0.0, "rtt_sumsq": 0.0,
+        "bif_n": 0, "bif_sum": 0.0,
+    }
+
+# Fields behind one partial aggregate (a single tshark pass per segment)
+PARTIAL_FIELDS = ["frame.time_epoch", "tcp.flags.ack", "tcp.analysis.ack_rtt", "tcp.analysis.bytes_in_flight"]
+PARTIAL_TEXT = ["tcp.flags.ack"]
+
+def tshark_table(pcap, fields, display_filter, text=()):
+    """
+    tshark -Tfields output parsed by read_csv (C parser, millions of rows).
+    Fields listed in `text` stay strings ("" when absent); the others are
+    numeric (NaN when absent or not a single number).
+    """
+    cmd = ["tshark", "-r", pcap, "-Y", display_filter, "-Tfields"]
+    for f in fields:
+        cmd += ["-e", f]
+    cmd += ["-E", "separator=\t"]
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True)
+    except subprocess.CalledProcessError:
+        return pd.DataFrame(columns=fields)
+    if not out.stdout.strip():
+        return pd.DataFrame(columns=fields)
+    # object (not pandas' string dtype) keeps the text columns cheap to build
+    df = pd.read_csv(io.BytesIO(out.stdout), sep="\t", header=None, names=fields, quoting=csv.QUOTE_NONE,
+                     dtype={f: object for f in text}, keep_default_na=False,
+                     na_values={f: [""] for f in fields if f not in text})
+    for f in fields:
+        if f not in text and not pd.api.types.is_numeric_dtype(df[f]):
+            # multi-valued fields ("a,b") leave the column as strings
+            df[f] = pd.to_numeric(df[f], errors="coerce")
+    return df
+
+def pcap_partial(pcap_path, role, tcp_filter):
+    """
+    Aggregate one capture segment into counters that merge exactly.
+
+    tshark analyses each segment on its own, so ACK RTT samples whose data
+    segment fell in the previous file are not seen.
+    """
+    return partial_from_fields(tshark_table(pcap_path, PARTIAL_FIELDS, tcp_filter, text=PARTIAL_TEXT), role)
+
+def partial_from_fields(df, role):
+    """
+    Partial aggregate from PARTIAL_FIELDS rows, as tshark_table returns them.
+
+    Mean gaps telescope to (last - first) / (n - 1), so only counts and the
+    first/last timestamps are kept; RTT keeps sum and sum of squares for the
+    std.
+    """
+    part = empty_partial(role)
+    if df.empty:
+        return part
+    t = df["frame.time_epoch"].dropna()
+    # tshark prints booleans as 1/0 or True/False depending on version
+    is_ack = df["tcp.flags.ack"].str.strip().str.lower().isin(["1", "true"])
+    t_ack = df.loc[is_ack, "frame.time_epoch"].dropna()
+    rtt = df["tcp.analysis.ack_rtt"].dropna()
+    bif = df["tcp.analysis.bytes_in_flight"].dropna()
+
+    if not t.empty:
+        part.update(n_frames=len(t), t_first=t.min(), t_last=t.max())
+    if not t_ack.empty:
+        part.update(n_acks=len(t_ack), ack_first=t_ack.min(), ack_last=t_ack.max())
+    part.update(rtt_n=len(rtt), rtt_sum=float(rtt.sum()), rtt_sumsq=float((rtt ** 2).sum()),
+                bif_n=len(bif), bif_sum=float(bif.sum()))
+    return part
+
+def merge_partials(a, b):
+    def lo(x, y):
+        return y if x is None else x if y is None else min(x, y)
+
+    def hi(x, y):
+        return y if x is None else x if y is None else max(x, y)
+
+    out = dict(a)
+    for k in ("n_frames", "n_acks", "rtt_n", "rtt_sum", "rtt_sumsq", "bif_n", "bif_sum"):
+        out[k] = a[k] + b[k]
+    out["t_first"], out["t_last"] = lo(a["t_first"], b["t_first"]), hi(a["t_last"], b["t_last"])
+    out["ack_first"], out["ack_last"] = lo(a["ack_first"], b["ack_first"]), hi(a["ack_last"], b["ack_last"])
+    return out
+
+def finalize_partial(part, name):
+    """Turn merged counters into the same row summarize_pcap_metrics produces."""
+    role = part["role"]
+
+    def mean_gap(n, first, last):
+        return (last - first) / (n - 1) * 1000 if n > 1 else 0
+
+    summary = {"pcap": name}
+    gap = mean_gap(part["n_frames"], part["t_first"], part["t_last"])
+    ack = mean_gap(part["n_acks"], part["ack_first"], part["ack_last"])
+    summary["gap_avg_ms"] = gap if role in ("client", "bottleneck") else 0
+    summary["ack_interval_avg_ms"] = ack
+    if role == "bottleneck" and part["rtt_n"]:
+        n = part["rtt_n"]
+        mean = part["rtt_sum"] / n
+        var = (part["rtt_sumsq"] - n * mean ** 2) / (n - 1) if n > 1 else float("nan")
+        summary["rtt_avg_ms"] = mean * 1000
+        summary["rtt_std_ms"] = max(var, 0) ** 0.5 * 1000
+    else:
+        summary["rtt_avg_ms"] = 0
+        summary["rtt_std_ms"] = 0
+    if role == "bottleneck" and part["bif_n"]:
+        summary["cwnd_avg_kB"] = part["bif_sum"] / part["bif_n"] / 1024
+    else:
+        summary["cwnd_avg_kB"] = 0
+    return summary
+
+def load_partial_summaries(run_path):
+    """Summaries from <prefix>.partial.json files written by segment_consumer.py."""
+    # udp_summary imports this module, so import it here rather than at the top
+    from udp_summary import finalize_udp_partial
+
+    out = []
+    for f in sorted(os.listdir(run_path)):
+        if not f.endswith(".partial.json"):
+            continue
+        with open(os.path.join(run_path, f)) as fh:
+            state = json.load(fh)
+        summary = finalize_partial(state["tcp"], state["prefix"] + ".pcap")
+        if state.get("udp"):
+            # iperf3 UDP counters merged across segments (per-packet detail: udp_summary.py)
+            summary.update(finalize_udp_partial(state["udp"]))
+        out.append(summary)
+    return out
+
 # ============================================================
 # Parse ss_client.txt to extract avg RTT and CWND
 # ============================================================
@@ -163,6 +313,9 @@ def normalize_run_name(run_folder):
 # Main processing logic
 # ============================================================
 def process_all_runs(root="demo", include_udp=PROCESS_UDP_DEFAULT):
+    # only the aggregation needs summary.py, so segment_consumer.py runs without it
+    from summary import bootstrap_runs
+
     all_summaries = []
 
     if not os.path.exists(root):
@@ -219,9 +372,15 @@ def process_all_runs(root="demo", include_udp=PROCESS_UDP_DEFAULT):
                 elif include_udp and lf.startswith('client_udp'):
                     candidates.append(f)
             pcap_files = candidates
+
+            # Rotated captures already reduced by segment_consumer.py take
+            # precedence over a full pcap of the same name
+            summaries = load_partial_summaries(run_path)
+            done = {s["pcap"] for s in summaries}
             for pcap_name in pcap_files:
-                pcap_path = os.path.join(run_path, pcap_name)
-                summary = summarize_pcap_metrics(pcap_path)
+                if pcap_name not in done:
+                    summaries.append(summarize_pcap_metrics(os.path.join(run_path, pcap_name)))
+            for summary in summaries:
                 if summary:
                     summary["run"] = run_id
                     summary["scenario"] = scenario
@@ -233,11 +392,15 @@ def process_all_runs(root="demo", include_udp=PROCESS_UDP_DEFAULT):
 
         # Write per-scenario summary (one row per pcap)
         if scenario_summaries:
-            df_summary = pd.DataFrame(scenario_summaries).fillna(0)
-            df_summary = df_summary[[
+            df_summary = pd.DataFrame(scenario_summaries)
+            columns = [
                 "pcap", "run", "rtt_avg_ms", "rtt_std_ms", "cwnd_avg_kB",
                 "gap_avg_ms", "ack_interval_avg_ms", "ss_avg_rtt_ms", "ss_avg_cwnd"
-            ]]
+            ]
+            # UDP counters only exist for segment-consumed captures; left empty elsewhere
+            udp_columns = [c for c in UDP_COUNTER_COLUMNS if c in df_summary.columns]
+            df_summary = df_summary[columns + udp_columns]
+            df_summary[columns] = df_summary[columns].fillna(0)
             out_csv = os.path.join(scenario_path, "pcap_summary.csv")
             df_summary.to_csv(out_csv, index=False)
             print(f"[+] Wrote {out_csv}")
@@ -269,6 +432,12 @@ def process_all_runs(root="demo", include_udp=PROCESS_UDP_DEFAULT):
             "n_pcaps": "sum"   # tổng số pcap trong scenario (thông tin bổ sung)
         }).reset_index()
 
+        # 3) CI của trung bình theo run cho từng scenario (t hoặc bootstrap, xem ci_method)
+        metrics = ["gap_avg_ms", "ack_interval_avg_ms", "ss_avg_rtt_ms", "ss_avg_cwnd"]
+        run_tables = {scen: g for scen, g in df_run_avg.groupby("scenario")}
+        ci_df, _, _, _ = bootstrap_runs(run_tables, metrics)
+        df_avg = df_avg.merge(ci_df.drop(columns=metrics).reset_index(), on="scenario", how="left")
+
         out_csv = os.path.join(root, "all_scenarios_pcap.csv")
         df_avg.to_csv(out_csv, index=False)
         print(f"[+] Wrote aggregated averages to {out_csv}")
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import re
@@ -47,6 +48,18 @@ def shorten_name(name: str):
     return name
 
 
+# Error bars from the CI columns written by summary.py / pcap_summary.py
+# (Student t or bootstrap percentile, per the ci_method column)
+def ci_xerr(df, metric):
+    """Return a 2xN xerr array for barh, or None if the CSV has no CI columns."""
+    lo_col, hi_col = f"{metric}_ci_lo", f"{metric}_ci_hi"
+    if lo_col not in df.columns or hi_col not in df.columns:
+        return None
+    lower = (df[metric] - df[lo_col]).clip(lower=0).fillna(0)
+    upper = (df[hi_col] - df[metric]).clip(lower=0).fillna(0)
+    return [lower.to_numpy(), upper.to_numpy()]
+
+
 # Small helper to compute bar height based on number of rows to avoid label overlap
 def compute_bar_height(n_rows, base=0.55):
     """
@@ -62,7 +75,7 @@ def compute_bar_height(n_rows, base=0.55):
 # ============================================================
 # PLOT 1: PCAP metrics (RTT, CWND, GAP)
 # ============================================================
-def plot_pcap_summary(pcap_csv):
+def plot_pcap_summary(pcap_csv, out_png="pcap_plot.png"):
     df = safe_read_csv(pcap_csv)
     if df.empty:
         print("[!] No data for pcap metrics.")
@@ -132,7 +145,8 @@ def plot_pcap_summary(pcap_csv):
         bar_height = compute_bar_height(n_scenarios, base=0.7)  # tăng base từ 0.55 lên 0.7
 
         # draw bars with per-bar color and dynamic height
-        bars = ax.barh(df_sorted["short_name"], df_sorted[metric], color=bar_colors, height=bar_height)
+        bars = ax.barh(df_sorted["short_name"], df_sorted[metric], color=bar_colors, height=bar_height,
+                       xerr=ci_xerr(df_sorted, metric), error_kw={"ecolor": "black", "capsize": 2, "lw": 0.8})
 
         # tăng font size của y tick labels và giảm rotation để dễ đọc hơn
         ax.tick_params(axis="y", labelsize=8)  # tăng từ 8 lên 9
@@ -163,13 +177,13 @@ def plot_pcap_summary(pcap_csv):
     plt.tight_layout(pad=2.5, rect=(0, 0, 0.85, 1.0))  # tăng padding tổng thể
     # tăng khoảng cách giữa các subplots để labels không bị chen chúc
     plt.subplots_adjust(hspace=0.8)  # tăng từ 0.6 lên 0.8
-    plt.savefig("pcap_plot.png", dpi=250, bbox_inches="tight")
-    print("[+] Saved pcap_plot.png")
+    plt.savefig(out_png, dpi=250, bbox_inches="tight")
+    print(f"[+] Saved {out_png}")
 
 # ============================================================
 # PLOT 2: TCP (avg BW, Fairness, Retrans) + UDP (avg BW, Jitter, Loss)
 # ============================================================
-def plot_bw_summary(bw_csv):
+def plot_bw_summary(bw_csv, out_png="summary_plot.png"):
     df = safe_read_csv(bw_csv)
     if df.empty:
         print("[!] No data for bandwidth metrics.")
@@ -228,7 +242,8 @@ def plot_bw_summary(bw_csv):
         bar_colors = [color_map.get(k, fallback_color) for k in df_sorted["pair_key"]]
 
         # draw bars with per-bar color
-        bars = ax.barh(df_sorted["short_name"], df_sorted[metric], color=bar_colors, height=0.55)
+        bars = ax.barh(df_sorted["short_name"], df_sorted[metric], color=bar_colors, height=0.55,
+                       xerr=ci_xerr(df_sorted, metric), error_kw={"ecolor": "black", "capsize": 2, "lw": 0.8})
 
         # Log scale only for Bandwidth
         if "Bandwidth" in label:
@@ -266,15 +281,19 @@ def plot_bw_summary(bw_csv):
 
     plt.tight_layout(pad=2.0, rect=(0, 0, 0.85, 1.0))  # leave space on right for legend
     plt.subplots_adjust(hspace=0.6)
-    plt.savefig("summary_plot.png", dpi=250, bbox_inches="tight")
-    print("[+] Saved summary_plot.png")
+    plt.savefig(out_png, dpi=250, bbox_inches="tight")
+    print(f"[+] Saved {out_png}")
 
 
 # ============================================================
 # Main
 # ============================================================
+def main(root="demo", out_dir="."):
+    os.makedirs(root, exist_ok=True)
+    os.makedirs(out_dir, exist_ok=True)
+    plot_pcap_summary(os.path.join(root, "all_scenarios_pcap.csv"), os.path.join(out_dir, "pcap_plot.png"))
+    plot_bw_summary(os.path.join(root, "all_scenarios_summary.csv"), os.path.join(out_dir, "summary_plot.png"))
+
 if __name__ == "__main__":
-    os.makedirs("demo", exist_ok=True)
-    plot_pcap_summary("demo/all_scenarios_pcap.csv")
-    plot_bw_summary("demo/all_scenarios_summary.csv")
+    main(sys.argv[1] if len(sys.argv) > 1 else "demo")
 
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import time
+import signal
+import argparse
+import pandas as pd
+
+from pcap_summary import (PARTIAL_FIELDS, PARTIAL_TEXT, tshark_table, pcap_role, empty_partial, pcap_partial,
+                          partial_from_fields, merge_partials, finalize_partial)
+from udp_summary import (HEADERS_SUFFIX, UDP_FIELDS, UDP_TEXT, udp_filter, decode_udp_headers, append_headers,
+                         udp_partial, merge_udp_partials, finalize_udp_partial)
+
+# Segment names written by `tcpdump -G N [-C MB] -w <prefix>_%Y%m%d_%H%M%S.pcap`
+# (-C appends a counter after the extension)
+SEGMENT_RE = re.compile(r"^(?P<prefix>.+)_(?P<stamp>\d{8}_\d{6})\.pcap(?P<n>\d*)$")
+
+POLL_S = 1.0
+
+# ============================================================
+# Segment discovery
+# ============================================================
+def list_segments(seg_dir):
+    """{prefix: [segment names in capture order]}"""
+    groups = {}
+    for f in os.listdir(seg_dir):
+        m = SEGMENT_RE.match(f)
+        if not m:
+            continue
+        key = (m.group("stamp"), int(m.group("n") or 0))
+        groups.setdefault(m.group("prefix"), []).append((key, f))
+    return {p: [f for _, f in sorted(segs)] for p, segs in groups.items()}
+
+# ============================================================
+# Per-prefix state: merged aggregates + processed segment names
+# ============================================================
+def state_path(out_dir, prefix):
+    return os.path.join(out_dir, f"{prefix}.partial.json")
+
+def headers_path(out_dir, prefix):
+    return os.path.join(out_dir, prefix + HEADERS_SUFFIX)
+
+def load_state(out_dir, prefix):
+    path = state_path(out_dir, prefix)
+    if os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+    else:
+        role, _ = pcap_role(prefix)
+        state = {"prefix": prefix, "segments": [], "tcp": empty_partial(role), "udp": {}, "udp_bytes": 0}
+    # Header records appended after the last saved state belong to a segment
+    # that will be processed again; drop them
+    headers = headers_path(out_dir, prefix)
+    if os.path.exists(headers) and os.path.getsize(headers) > state.get("udp_bytes", 0):
+        os.truncate(headers, state.get("udp_bytes", 0))
+    return state
+
+def save_state(out_dir, state):
+    # write-then-rename so a reader never sees a half-written file
+    path = state_path(out_dir, state["prefix"])
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+# ============================================================
+# One tshark pass per segment
+# ============================================================
+def scan_segment(path, role, tcp_filter, include_udp=True, counter_bits=32):
+    """(TCP partial aggregate, decoded iperf3 UDP headers) for one segment."""
+    if not include_udp:
+        return pcap_partial(path, role, tcp_filter), pd.DataFrame()
+    fields = PARTIAL_FIELDS + [f for f in UDP_FIELDS if f not in PARTIAL_FIELDS]
+    df = tshark_table(path, fields, f"({tcp_filter}) or ({udp_filter(counter_bits)})",
+                      text=PARTIAL_TEXT + UDP_TEXT)
+    is_udp = df["udp.srcport"].notna()
+    return partial_from_fields(df[~is_udp], role), decode_udp_headers(df[is_udp], counter_bits)
+
+# ============================================================
+# Process every closed segment not yet merged
+# ============================================================
+def consume(seg_dir, out_dir, final=False, discard=False, include_udp=True, counter_bits=32, states=None):
+    """
+    Merge closed segments into their prefix state. A segment is closed once
+    a newer one with the same prefix exists; with final=True (capture
+    stopped) the newest one is closed too. Returns the updated states.
+    """
+    states = {} if states is None else states
+    for prefix, segments in list_segments(seg_dir).items():
+        closed = segments if final else segments[:-1]
+        if prefix not in states:
+            states[prefix] = load_state(out_dir, prefix)
+        state = states[prefix]
+        _, tcp_filter = pcap_role(prefix)
+
+        for seg in closed:
+            if seg in state["segments"]:
+                continue
+            path = os.path.join(seg_dir, seg)
+            t = time.time()
+            if os.path.getsize(path) > 0:
+                tcp, udp = scan_segment(path, state["tcp"]["role"], tcp_filter, include_udp, counter_bits)
+                state["tcp"] = merge_partials(state["tcp"], tcp)
+                if not udp.empty:
+                    # counters for a quick summary, per-packet records for udp_summary.py
+                    state["udp"] = merge_udp_partials(state["udp"], udp_partial(udp))
+                    state["udp_bytes"] = append_headers(headers_path(out_dir, prefix), udp)
+            state["segments"].append(seg)
+            save_state(out_dir, state)
+            if discard:
+                # only after the merged state is on disk
+                os.remove(path)
+            print(f"[+] {seg} merged into {prefix} ({time.time() - t:.2f}s)", flush=True)
+    return states
+
+def final_rows(states):
+    rows = []
+    for prefix, state in sorted(states.items()):
+        row = finalize_partial(state["tcp"], prefix + ".pcap")
+        if state["udp"]:
+            row.update(finalize_udp_partial(state["udp"]))
+        row["segments"] = len(state["segments"])
+        rows.append(row)
+    return rows
+
+# ============================================================
+# Main loop
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally analyse rotated tcpdump segments as they close")
+    parser.add_argument("seg_dir", help="folder tcpdump writes <prefix>_<YYYYmmdd_HHMMSS>.pcap segments into")
+    parser.add_argument("--out", default=None, help="folder for <prefix>.partial.json (default: seg_dir)")
+    parser.add_argument("--final", action="store_true", help="capture has stopped: process everything once and exit")
+    parser.add_argument("--discard", action="store_true", help="delete each segment once it has been merged")
+    parser.add_argument("--no-udp", action="store_true", help="skip the iperf3 UDP headers")
+    parser.add_argument("--counter-64bit", action="store_true", help="iperf3 was run with --udp-counters-64bit")
+    args = parser.parse_args()
+    out_dir = args.out or args.seg_dir
+    counter_bits = 64 if args.counter_64bit else 32
+
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stop.append(True))
+
+    states = {}
+    if not args.final:
+        print(f"[+] Watching {args.seg_dir} for closed segments", flush=True)
+        while not stop:
+            consume(args.seg_dir, out_dir, discard=args.discard, include_udp=not args.no_udp,
+                    counter_bits=counter_bits, states=states)
+            time.sleep(POLL_S)
+
+    # Capture stopped (or --final): the newest segment of each prefix is closed now
+    consume(args.seg_dir, out_dir, final=True, discard=args.discard, include_udp=not args.no_udp,
+            counter_bits=counter_bits, states=states)
+    for row in final_rows(states):
+        print("[+] " + ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,62 @@
 #!/usr/bin/env python3
 import os
+import sys
 import re
 import json
+import math
+import itertools
+import numpy as np
 import pandas as pd
 
 ROOT_DIR = "demo"
 
+# Across-run confidence intervals. With fewer than BOOTSTRAP_MIN_RUNS runs a
+# percentile bootstrap of the mean under-covers (3 runs -> ~68%, 10 -> ~90%
+# for a "95%" CI), so those scenarios get a Student t interval instead.
+N_BOOT = 2000
+CI_LEVEL = 0.95
+BOOT_SEED = 0
+BOOTSTRAP_MIN_RUNS = 30
+
+# Exact permutation tests enumerate every split up to this many; beyond
+# that a random sample of splits is used
+MAX_PERMUTATIONS = 20000
+
+# Queue disciplines; scenarios that differ only in this token form a pair
+QUEUE_TOKENS = {"pfifo", "fifo", "red"}
+
 def get_flow_count(scenario_name: str):
     m = re.search(r"_(\d+)_", scenario_name)
     if m:
         return int(m.group(1))
     return 1
 
+def load_iperf_json(path):
+    """
+    iperf3 output as one dict, written either with -J (a single document) or
+    with --json-stream (one {"event", "data"} object per line).
+    """
+    with open(path) as f:
+        text = f.read()
+    try:
+        return json.loads(text)
+    except ValueError:
+        if not text.lstrip().startswith('{"event"'):
+            raise
+    # --json-stream: "start"/"end" carry the same objects as the -J document
+    data = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        event = json.loads(line)
+        if event.get("event") in ("start", "end", "error"):
+            data[event["event"]] = event.get("data")
+    return data
+
 def parse_iperf_json(path):
     """Parse iperf3 JSON (TCP or UDP)."""
     try:
-        with open(path) as f:
-            data = json.load(f)
+        data = load_iperf_json(path)
     except Exception as e:
         print(f"[!] Error reading {path}: {e}")
         return {}
@@ -146,6 +186,253 @@ def summarize_run(run_dir, flow_count):
 
     return out
 
+def percentile_interval(x, ci=CI_LEVEL):
+    """
+    Percentile interval along the last axis of `x`, ignoring NaN draws.
+
+    Rows without NaN (the usual case) use np.partition, which is linear in
+    the number of draws; np.nanquantile is only used for the rare rows that
+    contain some NaN.
+    """
+    alpha = (1 - ci) / 2
+    x = np.asarray(x, dtype=float)
+    rows = x.reshape(-1, x.shape[-1])
+    lo = np.full(len(rows), np.nan)
+    hi = np.full(len(rows), np.nan)
+
+    nan_count = np.isnan(rows).sum(axis=1)
+    full = nan_count == 0
+    n = rows.shape[1]
+    if full.any() and n:
+        pos = np.array([alpha, 1 - alpha]) * (n - 1)
+        k0, k1 = np.floor(pos).astype(int), np.ceil(pos).astype(int)
+        part = np.partition(rows[full], np.unique(np.r_[k0, k1]), axis=1)
+        frac = pos - k0
+        lo[full] = part[:, k0[0]] + (part[:, k1[0]] - part[:, k0[0]]) * frac[0]
+        hi[full] = part[:, k0[1]] + (part[:, k1[1]] - part[:, k0[1]]) * frac[1]
+    partial = (nan_count > 0) & (nan_count < n)
+    if partial.any():
+        lo[partial], hi[partial] = np.nanquantile(rows[partial], [alpha, 1 - alpha], axis=1)
+    return lo.reshape(x.shape[:-1]), hi.reshape(x.shape[:-1])
+
+# ============================================================
+# Student t critical values (no SciPy dependency)
+# ============================================================
+# Two-sided 95% critical values for df = 1..30; beyond that, and between
+# integers (Welch df), interpolate linearly in 1/df towards 1.960 (df = inf)
+T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+       2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+       2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+def t_critical(df, ci=CI_LEVEL):
+    """Two-sided t* for (possibly non-integer) df >= 1; NaN below that."""
+    if ci != 0.95:
+        raise ValueError("only the 95% t table is available")
+    df = np.asarray(df, dtype=float)
+    inv = np.r_[0.0, 1.0 / np.arange(len(T95), 0, -1)]
+    crit = np.r_[1.960, T95[::-1]]
+    with np.errstate(divide="ignore"):
+        return np.where(df >= 1, np.interp(1.0 / df, inv, crit), np.nan)
+
+def benjamini_hochberg(p):
+    """BH-adjusted p-values (false discovery rate); NaN entries are left out."""
+    p = np.asarray(p, dtype=float)
+    out = np.full(p.shape, np.nan)
+    ok = np.flatnonzero(~np.isnan(p))
+    if len(ok) == 0:
+        return out
+    order = ok[np.argsort(p[ok])]
+    ranked = p[order] * len(ok) / np.arange(1, len(ok) + 1)
+    out[order] = np.minimum(1.0, np.minimum.accumulate(ranked[::-1])[::-1])
+    return out
+
+# ============================================================
+# Across-run confidence intervals
+# ============================================================
+def run_matrix(run_tables, metrics=None):
+    """Pad per-scenario run tables into a (scenario, run, metric) array."""
+    scenarios = list(run_tables)
+    if metrics is None:
+        metrics = sorted(set().union(*(df.select_dtypes("number").columns for df in run_tables.values())))
+    n_runs = np.array([len(run_tables[s]) for s in scenarios])
+    values = np.full((len(scenarios), max(n_runs.max(), 1), len(metrics)), np.nan)
+    for i, s in enumerate(scenarios):
+        values[i, :n_runs[i]] = run_tables[s].reindex(columns=metrics).to_numpy(dtype=float)
+    return scenarios, list(metrics), values, n_runs
+
+def small_n_warning(n):
+    return (f"only {n} run{'s' if n != 1 else ''}: Student t intervals (assume roughly normal "
+            f"run means), low power" if n < BOOTSTRAP_MIN_RUNS else "")
+
+def bootstrap_runs(run_tables, metrics=None, n_boot=N_BOOT, ci=CI_LEVEL, seed=BOOT_SEED):
+    """
+    Confidence interval of the across-run mean for every scenario and metric.
+
+    run_tables: {scenario: DataFrame with one row per run}. Scenarios with
+    fewer than BOOTSTRAP_MIN_RUNS runs get a Student t interval, since a
+    bootstrap of a handful of runs is far too narrow. Only scenarios with
+    at least that many runs are bootstrapped (percentile interval), all in
+    one batch: runs are padded into a (scenario, run, metric) array and run
+    indices are drawn for every scenario at once. `ci_method` says which
+    interval each scenario's `_ci_lo`/`_ci_hi` columns hold.
+
+    Returns (DataFrame indexed by scenario with `<m>`, `<m>_ci_lo`,
+    `<m>_ci_hi`, `<m>_n` columns plus `ci_method` and `ci_warning`,
+    bootstrap means of shape (bootstrapped scenario, metric, n_boot),
+    bootstrapped scenario list, metric list).
+    """
+    scenarios, metrics, values, n_runs = run_matrix(run_tables, metrics)
+
+    n_obs = (~np.isnan(values)).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        observed = np.nansum(values, axis=1) / n_obs
+        sd = np.sqrt(np.nansum((values - observed[:, None, :]) ** 2, axis=1) / (n_obs - 1))
+    half = t_critical(n_obs - 1, ci) * sd / np.sqrt(n_obs)
+    lo, hi = observed - half, observed + half
+
+    use_boot = np.flatnonzero(n_runs >= BOOTSTRAP_MIN_RUNS)
+    boot = np.empty((0, len(metrics), n_boot))
+    if len(use_boot):
+        sub, sub_runs = values[use_boot], n_runs[use_boot]
+        # Draw run indices uniformly in [0, n_runs) per scenario: (scenario, boot, run)
+        rng = np.random.default_rng(seed)
+        idx = (rng.random((len(sub), n_boot, sub.shape[1])) * sub_runs[:, None, None]).astype(np.int64)
+
+        total = np.zeros((len(sub), n_boot, len(metrics)))
+        count = np.zeros((len(sub), n_boot, len(metrics)))
+        rows = np.arange(len(sub))[:, None]
+        for r in range(sub.shape[1]):
+            drawn = sub[rows, idx[:, :, r]]                    # (scenario, boot, metric)
+            # a resample has n_runs draws; slots past a scenario's run count are padding
+            ok = ~np.isnan(drawn) & (r < sub_runs)[:, None, None]
+            total += np.where(ok, drawn, 0)
+            count += ok
+        with np.errstate(invalid="ignore", divide="ignore"):
+            boot = np.ascontiguousarray((total / count).transpose(0, 2, 1))
+        lo[use_boot], hi[use_boot] = percentile_interval(boot, ci)
+
+    out = {}
+    for j, m in enumerate(metrics):
+        out[m] = observed[:, j]
+        out[f"{m}_ci_lo"] = lo[:, j]
+        out[f"{m}_ci_hi"] = hi[:, j]
+        out[f"{m}_n"] = n_obs[:, j]
+    out["ci_method"] = np.where(n_runs >= BOOTSTRAP_MIN_RUNS, "bootstrap percentile", "student t")
+    out["ci_warning"] = [small_n_warning(n) for n in n_runs]
+    df = pd.DataFrame(out, index=pd.Index(scenarios, name="scenario"))
+    return df, boot, [scenarios[i] for i in use_boot], metrics
+
+# ============================================================
+# Scenario-difference tests
+# ============================================================
+def queue_pair_key(scenario):
+    """Scenario name with the queue discipline token removed."""
+    return "_".join(t for t in scenario.split("_") if t.lower() not in QUEUE_TOKENS)
+
+def queue_pairs(scenarios):
+    """Index pairs of scenarios that differ only in their queue discipline."""
+    groups = {}
+    for i, s in enumerate(scenarios):
+        groups.setdefault(queue_pair_key(s), []).append(i)
+    pairs = [(a, b) for idx in groups.values() for k, a in enumerate(idx) for b in idx[k + 1:]]
+    return np.array([p[0] for p in pairs], dtype=np.int64), np.array([p[1] for p in pairs], dtype=np.int64)
+
+def permutation_splits(n_a, n_b, seed=BOOT_SEED):
+    """
+    Boolean (split, run) matrix marking group A in every relabelling.
+
+    All C(n_a + n_b, n_a) splits are enumerated when there are at most
+    MAX_PERMUTATIONS of them, otherwise a random sample is drawn (row 0 is
+    always the observed split).
+    """
+    n = n_a + n_b
+    if math.comb(n, n_a) <= MAX_PERMUTATIONS:
+        splits = np.zeros((math.comb(n, n_a), n), dtype=bool)
+        for k, combo in enumerate(itertools.combinations(range(n), n_a)):
+            splits[k, list(combo)] = True
+        return splits
+    rng = np.random.default_rng(seed)
+    order = np.argsort(rng.random((MAX_PERMUTATIONS, n)), axis=1)[:, :n_a]
+    splits = np.zeros((MAX_PERMUTATIONS, n), dtype=bool)
+    np.put_along_axis(splits, order, True, axis=1)
+    splits[0] = np.arange(n) < n_a
+    return splits
+
+def permutation_p(xa, xb):
+    """
+    Two-sided permutation p-value of mean(A) - mean(B), batched over pairs.
+
+    xa: (pair, n_a, metric), xb: (pair, n_b, metric). With 3 runs each there
+    are only 20 splits, so the smallest attainable p is 0.1. A metric with a
+    missing run in either scenario gets NaN.
+    """
+    n_a, n_b = xa.shape[1], xb.shape[1]
+    pooled = np.concatenate([xa, xb], axis=1)                    # (pair, run, metric)
+    splits = permutation_splits(n_a, n_b).astype(float)           # (split, run)
+    sum_a = np.einsum("kn,pnm->pkm", splits, pooled)
+    diffs = sum_a / n_a - (pooled.sum(axis=1)[:, None, :] - sum_a) / n_b
+    observed = xa.mean(axis=1) - xb.mean(axis=1)
+    p = (np.abs(diffs) >= np.abs(observed)[:, None, :] - 1e-12).mean(axis=1)
+    return np.where(np.isnan(observed), np.nan, p)
+
+def pairwise_differences(run_tables, metrics=None, ci=CI_LEVEL, pairs="queue"):
+    """
+    Difference of across-run means (a - b) for scenario pairs and metrics.
+
+    pairs="queue" compares only scenarios that differ in their queue
+    discipline (pfifo vs RED, as paired in plot_result); pairs="all"
+    compares every pair. Each row carries a 95% Welch t interval of the
+    difference, an exact permutation p-value (`p_value`; with 3 runs a side
+    the smallest attainable is 0.1) and `p_adj`, its Benjamini-Hochberg
+    adjustment over all rows written.
+    """
+    scenarios, metrics, values, n_runs = run_matrix(run_tables, metrics)
+    if pairs == "all":
+        ia, ib = np.triu_indices(len(scenarios), k=1)
+    else:
+        ia, ib = queue_pairs(scenarios)
+    columns = ["scenario_a", "scenario_b", "metric", "n_a", "n_b", "diff", "ci_lo", "ci_hi",
+               "p_value", "p_adj", "warning"]
+    if len(ia) == 0:
+        return pd.DataFrame(columns=columns)
+
+    n_obs = (~np.isnan(values)).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(values, axis=1) / n_obs
+        var = np.nansum((values - mean[:, None, :]) ** 2, axis=1) / (n_obs - 1)
+        se2_a, se2_b = var[ia] / n_obs[ia], var[ib] / n_obs[ib]
+        se = np.sqrt(se2_a + se2_b)
+        # Welch-Satterthwaite degrees of freedom
+        dof = (se2_a + se2_b) ** 2 / (se2_a ** 2 / (n_obs[ia] - 1) + se2_b ** 2 / (n_obs[ib] - 1))
+        diff = mean[ia] - mean[ib]
+    half = np.where(se > 0, t_critical(dof, ci) * se, np.where(np.isnan(se), np.nan, 0.0))
+
+    # Batch the permutation test over pairs with the same run counts
+    p_value = np.full(diff.shape, np.nan)
+    counts = np.stack([n_runs[ia], n_runs[ib]], axis=1)
+    for n_a, n_b in np.unique(counts, axis=0):
+        sel = np.flatnonzero((counts[:, 0] == n_a) & (counts[:, 1] == n_b))
+        p_value[sel] = permutation_p(values[ia[sel], :n_a], values[ib[sel], :n_b])
+
+    n_met = len(metrics)
+    names = np.asarray(scenarios)
+    df = pd.DataFrame({
+        "scenario_a": np.repeat(names[ia], n_met),
+        "scenario_b": np.repeat(names[ib], n_met),
+        "metric": np.tile(metrics, len(ia)),
+        "n_a": n_obs[ia].ravel(),
+        "n_b": n_obs[ib].ravel(),
+        "diff": diff.ravel(),
+        "ci_lo": (diff - half).ravel(),
+        "ci_hi": (diff + half).ravel(),
+        "p_value": p_value.ravel(),
+    })
+    df["p_adj"] = benjamini_hochberg(df["p_value"].to_numpy())
+    n_min = np.minimum(df["n_a"].to_numpy(), df["n_b"].to_numpy())
+    warnings = {n: small_n_warning(n) for n in np.unique(n_min)}
+    df["warning"] = [warnings[n] for n in n_min]
+    return df
+
 def summarize_scenario(path, flow_count):
     runs = sorted([
         os.path.join(path, d) for d in os.listdir(path)
@@ -170,31 +457,50 @@ def summarize_scenario(path, flow_count):
     df.to_csv(out_path, index=False)
     print(f"[*] Saved {out_path}")
 
-    return os.path.basename(path), avg
+    return os.path.basename(path), avg, df[df["run_id"] != "avg"]
 
-def main():
+def main(root=ROOT_DIR, all_pairs=False):
     scenario_summaries = []
-    for scen in sorted(os.listdir(ROOT_DIR)):
-        scen_path = os.path.join(ROOT_DIR, scen)
+    run_tables = {}
+    for scen in sorted(os.listdir(root)):
+        scen_path = os.path.join(root, scen)
         if not os.path.isdir(scen_path):
             continue
         flow_count = get_flow_count(scen)
         print(f"\n=== Scenario: {scen} ===")
         result = summarize_scenario(scen_path, flow_count)
         if result:
-            scen_name, avg_metrics = result
+            scen_name, avg_metrics, runs = result
             avg_metrics["scenario"] = scen_name
             scenario_summaries.append(avg_metrics)
+            run_tables[scen_name] = runs
 
     if scenario_summaries:
         df = pd.DataFrame(scenario_summaries)
         df = df.set_index("scenario")
-        out_path = os.path.join(ROOT_DIR, "all_scenarios_summary.csv")
+        metrics = list(df.columns)
+        ci_df, boot, scenarios, metrics = bootstrap_runs(run_tables, metrics)
+        df = df.join(ci_df.drop(columns=metrics))
+        out_path = os.path.join(root, "all_scenarios_summary.csv")
         df.to_csv(out_path)
         print(f"\n[*] Global summary saved to {out_path}")
+
+        if df["ci_warning"].astype(bool).any():
+            print(f"[!] Fewer than {BOOTSTRAP_MIN_RUNS} runs in some scenarios: their CIs are "
+                  "Student t intervals, not bootstrap (see ci_method / ci_warning columns)")
+
+        out_path = os.path.join(root, "all_scenarios_pairwise.csv")
+        pairwise_differences(run_tables, metrics, pairs="all" if all_pairs else "queue").to_csv(out_path, index=False)
+        print(f"[*] Pairwise scenario differences saved to {out_path}")
+
+        if scenarios:
+            out_path = os.path.join(root, "all_scenarios_bootstrap.npz")
+            np.savez_compressed(out_path, boot=boot, scenarios=np.asarray(scenarios), metrics=np.asarray(metrics))
+            print(f"[*] Bootstrap distributions saved to {out_path}")
     else:
         print("[!] No scenarios summarized.")
 
 if __name__ == "__main__":
-    main()
+    args = [a for a in sys.argv[1:] if a != "--all-pairs"]
+    main(args[0] if args else ROOT_DIR, all_pairs="--all-pairs" in sys.argv[1:])
 
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+import os
+import re
+import argparse
+import numpy as np
+import pandas as pd
+
+from pcap_summary import CLIENT_IP, SERVER_IP, IPERF_PORT, normalize_run_name, tshark_table
+
+# iperf3 UDP payload header: sec (u32), usec (u32), pcount (u32, or u64 with
+# --udp-counters-64bit), all big-endian.
+HEADER_BYTES = {32: 12, 64: 16}
+
+# RFC 3550 section 6.4.1: J += (|D| - J) / 16
+JITTER_GAIN = 1.0 / 16
+
+# Time-series bin width (seconds, on the sender's clock)
+BIN_S = 1.0
+
+# Capture points along the path, in order client -> bottleneck -> server
+POINTS = ["client", "bottleneck", "server"]
+
+# Stream/sequence pairs are packed into one int64 key: port << SEQ_BITS | seq
+SEQ_BITS = 40
+
+# ============================================================
+# Helper: extract iperf3 UDP headers from a pcap with tshark
+# ============================================================
+UDP_FIELDS = ["frame.time_epoch", "udp.srcport", "udp.payload"]
+UDP_TEXT = ["udp.payload"]
+
+# ASCII code -> hex digit value (anything else -> 0)
+HEX_DIGITS = np.zeros(128, dtype=np.uint8)
+for i, c in enumerate("0123456789abcdef"):
+    HEX_DIGITS[ord(c)] = HEX_DIGITS[ord(c.upper())] = i
+
+def udp_filter(counter_bits=32):
+    """Display filter for client->server iperf3 datagrams carrying a full header."""
+    return (f"udp and ip.src=={CLIENT_IP} and ip.dst=={SERVER_IP} "
+            f"and udp.dstport=={IPERF_PORT} and udp.length>={8 + HEADER_BYTES[counter_bits]}")
+
+def tshark_udp_headers(pcap, counter_bits=32):
+    """Return DataFrame(stream, seq, sent, arrival) for client->server iperf3 datagrams."""
+    try:
+        df = tshark_table(pcap, UDP_FIELDS, udp_filter(counter_bits), text=UDP_TEXT)
+    except FileNotFoundError:
+        return pd.DataFrame()
+    return decode_udp_headers(df, counter_bits)
+
+def decode_udp_headers(df, counter_bits=32):
+    """UDP_FIELDS rows, as tshark_table returns them -> DataFrame(stream, seq, sent, arrival)."""
+    header_bytes = HEADER_BYTES[counter_bits]
+    df = df.dropna(subset=["frame.time_epoch", "udp.srcport"])
+    if df.empty:
+        return pd.DataFrame()
+    payload = df["udp.payload"].to_numpy(dtype=object)
+    if ":" in payload[0][:3]:
+        # older tshark prints byte fields colon-separated
+        payload = df["udp.payload"].str.replace(":", "", regex=False).to_numpy(dtype=object)
+
+    # Fixed-width unicode keeps only the iperf3 header; its code points are
+    # then mapped to nibbles in one table lookup (no per-row string work)
+    hexes = np.asarray(payload, dtype=f"U{2 * header_bytes}")
+    codes = hexes.view(np.uint32).reshape(len(hexes), 2 * header_bytes)
+    ok = codes[:, -1] != 0                      # shorter payload -> zero padding
+    if not ok.any():
+        return pd.DataFrame()
+    nibbles = HEX_DIGITS[np.minimum(codes[ok], 127)]
+    raw = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+    sec = raw[:, 0:4].copy().view(">u4").ravel().astype(np.float64)
+    usec = raw[:, 4:8].copy().view(">u4").ravel().astype(np.float64)
+    if counter_bits == 64:
+        seq = raw[:, 8:16].copy().view(">u8").ravel().astype(np.int64)
+    else:
+        seq = raw[:, 8:12].copy().view(">u4").ravel().astype(np.int64)
+
+    return pd.DataFrame({
+        "stream": df["udp.srcport"].to_numpy()[ok].astype(np.int64),
+        "seq": seq,
+        "sent": sec + usec * 1e-6,
+        "arrival": df["frame.time_epoch"].to_numpy()[ok].astype(np.float64),
+    })
+
+# ============================================================
+# Per-packet header records kept from rotated segments
+# ============================================================
+# segment_consumer.py appends each segment's decoded headers to
+# <prefix>.udp.bin (32 bytes per datagram instead of the whole capture)
+HEADERS_SUFFIX = ".udp.bin"
+HEADER_DTYPE = np.dtype([("stream", "<i8"), ("seq", "<i8"), ("sent", "<f8"), ("arrival", "<f8")])
+
+def append_headers(path, frames):
+    """Append frames to a header-record file; returns the file size afterwards."""
+    rec = np.empty(len(frames), dtype=HEADER_DTYPE)
+    for name in HEADER_DTYPE.names:
+        rec[name] = frames[name].to_numpy()
+    with open(path, "ab") as f:
+        f.write(rec.tobytes())
+        return f.tell()
+
+def read_headers(path):
+    """DataFrame(stream, seq, sent, arrival) from a <prefix>.udp.bin file."""
+    count = os.path.getsize(path) // HEADER_DTYPE.itemsize
+    if not count:
+        return pd.DataFrame()
+    rec = np.fromfile(path, dtype=HEADER_DTYPE, count=count)
+    return pd.DataFrame({name: rec[name] for name in HEADER_DTYPE.names})
+
+def load_frames(path, counter_bits=32):
+    if path.endswith(HEADERS_SUFFIX):
+        return read_headers(path)
+    return tshark_udp_headers(path, counter_bits)
+
+# ============================================================
+# RFC 3550 interarrival jitter (per stream, arrival order)
+# ============================================================
+def rfc3550_jitter(transit):
+    """Running jitter estimate (same unit as `transit`) after each packet."""
+    if len(transit) < 2:
+        return np.zeros(len(transit))
+    d = np.abs(np.diff(transit))
+    # The recursion is an EWMA seeded at J=0; pandas runs it in compiled code
+    j = pd.Series(np.concatenate(([0.0], d))).ewm(alpha=JITTER_GAIN, adjust=False).mean()
+    return j.to_numpy()
+
+# ============================================================
+# Per-stream metrics for one capture point
+# ============================================================
+def analyze_point(frames):
+    """
+    Vectorized per-stream loss, loss runs, reordering, duplicates and jitter.
+
+    Returns (per-stream DataFrame, frames sorted by stream/arrival with
+    per-packet `reordered` and `jitter_ms` columns).
+    """
+    order = np.lexsort((frames["arrival"].to_numpy(), frames["stream"].to_numpy()))
+    frames = frames.iloc[order].reset_index(drop=True)
+    stream = frames["stream"].to_numpy()
+    seq = frames["seq"].to_numpy()
+
+    # Streams are contiguous after the sort; boundaries replace np.unique
+    starts = np.flatnonzero(np.r_[True, stream[1:] != stream[:-1]])
+    streams = stream[starts]
+    n = len(streams)
+    gidx = np.repeat(np.arange(n), np.diff(np.append(starts, len(stream))))
+
+    seq_min = np.minimum.reduceat(seq, starts)
+    seq_max = np.maximum.reduceat(seq, starts)
+    received = np.bincount(gidx, minlength=n)
+
+    # Offset each stream into its own range so a single running max covers all
+    span = int((seq_max - seq_min).max()) + 1
+    key = gidx.astype(np.int64) * span + (seq - seq_min[gidx])
+
+    prev_max = np.maximum.accumulate(key)
+    reordered = np.zeros(len(key), dtype=bool)
+    reordered[1:] = key[1:] < prev_max[:-1]
+
+    ukeys = np.sort(key)
+    ukeys = ukeys[np.r_[True, ukeys[1:] != ukeys[:-1]]]
+    ugroup = ukeys // span
+    unique = np.bincount(ugroup, minlength=n)
+    expected = seq_max - seq_min + 1
+    lost = expected - unique
+
+    # Loss runs: gaps between consecutive unique sequence numbers in a stream
+    gaps = np.diff(ukeys) - 1
+    same = ugroup[1:] == ugroup[:-1]
+    run_mask = same & (gaps > 0)
+    run_group = ugroup[1:][run_mask]
+    run_len = gaps[run_mask]
+    n_runs = np.bincount(run_group, minlength=n)
+    max_run = np.zeros(n, dtype=np.int64)
+    np.maximum.at(max_run, run_group, run_len)
+
+    transit = frames["arrival"].to_numpy() - frames["sent"].to_numpy()
+    ends = np.append(starts[1:], len(frames))
+    jitter = np.concatenate([rfc3550_jitter(transit[s:e]) for s, e in zip(starts, ends)]) * 1000
+
+    frames["reordered"] = reordered
+    frames["jitter_ms"] = jitter
+
+    per_stream = pd.DataFrame({
+        "stream": streams,
+        "received": received,
+        "duplicates": received - unique,
+        "expected": expected,
+        "lost": lost,
+        "lost_pct": np.where(expected > 0, lost / np.maximum(expected, 1) * 100, 0.0),
+        "loss_runs": n_runs,
+        "loss_run_avg": np.where(n_runs > 0, lost / np.maximum(n_runs, 1), 0.0),
+        "loss_run_max": max_run,
+        "reordered": np.bincount(gidx, weights=reordered, minlength=n).astype(np.int64),
+        "jitter_ms": jitter[ends - 1],
+        "jitter_avg_ms": np.bincount(gidx, weights=jitter, minlength=n) / np.maximum(received, 1),
+    })
+    return per_stream, frames
+
+def stream_seq_key(frames):
+    return (frames["stream"].to_numpy(dtype=np.int64) << SEQ_BITS) | frames["seq"].to_numpy(dtype=np.int64)
+
+def sorted_isin(keys, other):
+    """np.isin via one sort + searchsorted (much faster than hashing for int64 keys)."""
+    other = np.sort(other)
+    if len(other) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    pos = np.minimum(np.searchsorted(other, keys), len(other) - 1)
+    return other[pos] == keys
+
+# ============================================================
+# Mergeable per-stream counters (one capture segment at a time)
+# ============================================================
+def udp_partial(df):
+    """{stream: [received, seq_min, seq_max]} for one segment's decoded headers."""
+    if df.empty:
+        return {}
+    g = df.groupby("stream")["seq"].agg(["size", "min", "max"])
+    return {str(stream): [int(r["size"]), int(r["min"]), int(r["max"])] for stream, r in g.iterrows()}
+
+def merge_udp_partials(a, b):
+    out = {k: list(v) for k, v in a.items()}
+    for stream, (n, lo, hi) in b.items():
+        if stream in out:
+            cur = out[stream]
+            out[stream] = [cur[0] + n, min(cur[1], lo), max(cur[2], hi)]
+        else:
+            out[stream] = [n, lo, hi]
+    return out
+
+def finalize_udp_partial(part):
+    """Loss from counters; duplicates across segments count as received."""
+    received = sum(v[0] for v in part.values())
+    expected = sum(v[2] - v[1] + 1 for v in part.values())
+    lost = max(expected - received, 0)
+    return {
+        "udp_received": received,
+        "udp_expected": expected,
+        "udp_lost_pct": lost / expected * 100 if expected else 0,
+    }
+
+# ============================================================
+# Analyse all capture points of one run
+# ============================================================
+def capture_point(name):
+    lname = name.lower()
+    return next((p for p in POINTS if lname.startswith(p)), None)
+
+def find_run_captures(run_path):
+    """
+    {point: path}. Header records from segment_consumer.py (<prefix>.udp.bin)
+    take precedence over a full pcap for the same capture point.
+    """
+    pcaps, headers = {}, {}
+    for f in sorted(os.listdir(run_path)):
+        lf = f.lower()
+        path = os.path.join(run_path, f)
+        if lf.endswith(HEADERS_SUFFIX):
+            point = capture_point(lf)
+            if point and os.path.getsize(path) > 0:
+                headers.setdefault(point, path)
+        elif not lf.endswith(".pcap"):
+            continue
+        elif lf.startswith("client_udp"):
+            pcaps.setdefault("client", path)
+        elif lf == "bottleneck.pcap":
+            pcaps["bottleneck"] = path
+        elif lf == "server.pcap":
+            pcaps["server"] = path
+    return pcaps | headers
+
+def analyze_run(captures, counter_bits=32):
+    """
+    captures: {point: pcap or header-record path}. Returns (stream_rows
+    DataFrame, path_row dict, timeseries DataFrame) or None when no iperf3
+    UDP datagrams were found.
+    """
+    frames = {}
+    for point in POINTS:
+        if point in captures and os.path.getsize(captures[point]) > 0:
+            df = load_frames(captures[point], counter_bits)
+            if not df.empty:
+                frames[point] = df
+    if not frames:
+        return None
+
+    # Reference set of sent datagrams: the earliest capture point available
+    ref_point = next(p for p in POINTS if p in frames)
+    ref = frames[ref_point]
+    ref_key = stream_seq_key(ref)
+    order = np.argsort(ref_key, kind="stable")
+    first = order[np.r_[True, ref_key[order][1:] != ref_key[order][:-1]]]
+    ref, ref_key = ref.iloc[first], ref_key[first]
+    t0 = min(df["sent"].min() for df in frames.values())
+    ref_bin = np.floor((ref["sent"].to_numpy() - t0) / BIN_S).astype(np.int64)
+
+    stream_rows, series, seen = [], [], {}
+    for point, df in frames.items():
+        per_stream, sorted_frames = analyze_point(df)
+        seen[point] = sorted_isin(ref_key, stream_seq_key(sorted_frames))
+
+        missing = ~seen[point]
+        lost_by_stream = pd.Series(ref["stream"].to_numpy()[missing]).value_counts()
+        per_stream["lost_vs_ref"] = lost_by_stream.reindex(per_stream["stream"], fill_value=0).to_numpy()
+        per_stream["ref_point"] = ref_point
+        per_stream.insert(0, "point", point)
+        stream_rows.append(per_stream)
+
+        # Time series on the sender clock: mean jitter per bin, counts per bin
+        b = np.floor((sorted_frames["sent"].to_numpy() - t0) / BIN_S).astype(np.int64)
+        ts = sorted_frames.assign(bin=b).groupby("bin").agg(
+            pkts=("seq", "size"),
+            reordered=("reordered", "sum"),
+            jitter_ms=("jitter_ms", "mean"),
+        )
+        lost_by_bin = pd.Series(ref_bin[missing]).value_counts()
+        ts = ts.reindex(ts.index.union(lost_by_bin.index), fill_value=0)
+        ts["lost"] = lost_by_bin.reindex(ts.index, fill_value=0)
+        ts = ts.rename_axis("bin").reset_index()
+        ts.insert(0, "point", point)
+        ts.insert(1, "t_s", ts.pop("bin") * BIN_S)
+        series.append(ts)
+
+    # Where along the path did each reference datagram disappear?
+    path = {"ref_point": ref_point, "sent": len(ref_key)}
+    if "bottleneck" in seen and "server" in seen:
+        path["drop_before_bottleneck"] = int((~seen["bottleneck"] & ~seen["server"]).sum())
+        path["drop_after_bottleneck"] = int((seen["bottleneck"] & ~seen["server"]).sum())
+        # reached the server but was never seen at the bottleneck -> capture miss
+        path["bottleneck_capture_miss"] = int((~seen["bottleneck"] & seen["server"]).sum())
+    elif "server" in seen:
+        path["drop_end_to_end"] = int((~seen["server"]).sum())
+    for point in seen:
+        path[f"seen_{point}"] = int(seen[point].sum())
+
+    return pd.concat(stream_rows, ignore_index=True), path, pd.concat(series, ignore_index=True)
+
+# ============================================================
+# Main processing logic
+# ============================================================
+def process_all_runs(root="demo", counter_bits=32):
+    all_paths = []
+
+    if not os.path.exists(root):
+        print(f"[!] Root path does not exist: {root}")
+        return
+
+    entries = sorted(os.listdir(root))
+    is_run_level = any(re.search(r"run[_-]?\d+", name) and os.path.isdir(os.path.join(root, name))
+                       for name in entries)
+    if is_run_level:
+        scenarios = [os.path.basename(root)]
+        scenario_paths = [root]
+    else:
+        scenarios = entries
+        scenario_paths = [os.path.join(root, s) for s in scenarios]
+
+    for scenario, scenario_path in zip(scenarios, scenario_paths):
+        if not os.path.isdir(scenario_path):
+            continue
+
+        stream_frames, series_frames = [], []
+        for run in sorted(os.listdir(scenario_path)):
+            run_path = os.path.join(scenario_path, run)
+            if not os.path.isdir(run_path):
+                continue
+            run_id = normalize_run_name(run)
+
+            result = analyze_run(find_run_captures(run_path), counter_bits)
+            if result is None:
+                continue
+            per_stream, path, series = result
+            per_stream.insert(0, "run", run_id)
+            series.insert(0, "run", run_id)
+            stream_frames.append(per_stream)
+            series_frames.append(series)
+
+            path["run"] = run_id
+            path["scenario"] = scenario
+            # run-level end-to-end figures, taken at the furthest point available
+            last = per_stream[per_stream["point"] == per_stream["point"].iloc[-1]]
+            path["lost_pct"] = last["lost_pct"].mean()
+            path["loss_run_avg"] = last["loss_run_avg"].mean()
+            path["loss_run_max"] = last["loss_run_max"].max()
+            path["reordered"] = last["reordered"].sum()
+            path["jitter_ms"] = last["jitter_ms"].mean()
+            all_paths.append(path)
+
+        if stream_frames:
+            out_csv = os.path.join(scenario_path, "udp_summary.csv")
+            pd.concat(stream_frames, ignore_index=True).to_csv(out_csv, index=False)
+            print(f"[+] Wrote {out_csv}")
+            out_csv = os.path.join(scenario_path, "udp_timeseries.csv")
+            pd.concat(series_frames, ignore_index=True).to_csv(out_csv, index=False)
+            print(f"[+] Wrote {out_csv}")
+
+    # ============================================================
+    # Global summary (mean over runs per scenario)
+    # ============================================================
+    if all_paths:
+        # runs without a bottleneck/server capture leave NaN, which mean() skips
+        df_all = pd.DataFrame(all_paths)
+        df_avg = df_all.drop(columns=["run", "ref_point"]).groupby("scenario").mean().reset_index()
+        out_csv = os.path.join(root, "all_scenarios_udp.csv")
+        df_avg.to_csv(out_csv, index=False)
+        print(f"[+] Wrote aggregated averages to {out_csv}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-packet UDP loss/jitter analysis from iperf3 payload headers")
+    parser.add_argument("root", nargs='?', default="demo", help="root experiments folder (default: demo)")
+    parser.add_argument("--counter-64bit", action="store_true",
+                        help="iperf3 was run with --udp-counters-64bit")
+    args = parser.parse_args()
+    print(f"[+] Scanning experiments under: {args.root}")
+    process_all_runs(root=args.root, counter_bits=64 if args.counter_64bit else 32)